@@ -0,0 +1,44 @@
+import os
+import glob
+import time
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
+
+from src.common.utils import read_pdf
+
+
+def run(pdf_files, **kwargs):
+    elapsed = []
+    for pdf_path in pdf_files:
+        start = time.perf_counter()
+        read_pdf(pdf_path, **kwargs)
+        elapsed.append(time.perf_counter() - start)
+    return elapsed
+
+
+def report(name, pdf_files, elapsed):
+    print(f"{name}: 总耗时{sum(elapsed):.2f}秒，单份平均{sum(elapsed) / len(elapsed) * 1000:.0f}ms")
+    slowest = max(range(len(elapsed)), key=elapsed.__getitem__)
+    print(f"  最慢: {os.path.basename(pdf_files[slowest])} {elapsed[slowest] * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比顺序提取与按页并行提取PDF文本的耗时")
+    parser.add_argument("corpus", help="存放样例PDF的目录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--time-budget", type=float, default=None)
+    args = parser.parse_args()
+
+    pdf_files = sorted(glob.glob(os.path.join(args.corpus, "**", "*.pdf"), recursive=True))
+    if not pdf_files:
+        raise SystemExit(f"{args.corpus} 下没有PDF文件")
+    print(f"样例PDF共{len(pdf_files)}份")
+
+    report("顺序提取", pdf_files, run(pdf_files, time_budget=args.time_budget))
+
+    # 进程池在整个测试中复用，与服务端PdfParsePool的用法一致
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        run(pdf_files[:1], parallel=True, workers=args.workers, executor=executor)
+        elapsed = run(pdf_files, parallel=True, workers=args.workers, time_budget=args.time_budget, executor=executor)
+    report(f"并行提取({args.workers}进程)", pdf_files, elapsed)
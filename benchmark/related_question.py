@@ -0,0 +1,43 @@
+import time
+import random
+import argparse
+import statistics
+
+from src.graph import graph
+from src.graph.graph import get_driver, get_related_question
+
+
+def run(question_ids, rounds, asked_size):
+    latencies = []
+    for _ in range(rounds):
+        current_id = random.choice(question_ids)
+        asked_questions = set(random.sample(question_ids, min(asked_size, len(question_ids))))
+        start = time.perf_counter()
+        get_related_question(current_id, asked_questions, top_k=5)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name}: 平均{statistics.mean(latencies):.2f}ms，p50 {statistics.median(latencies):.2f}ms，p95 {p95:.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比实时计算与预计算相关问题表的get_related_question延迟")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--asked", type=int, default=10, help="每次查询携带的已问问题数")
+    args = parser.parse_args()
+
+    with get_driver().session() as session:
+        question_ids = [record["id"] for record in session.run("MATCH (q:Question) RETURN q.id as id")]
+
+    # 预热连接池
+    run(question_ids, 20, args.asked)
+
+    graph.use_related_table = False
+    report("实时计算", run(question_ids, args.rounds, args.asked))
+
+    graph.use_related_table = True
+    report("预计算表", run(question_ids, args.rounds, args.asked))
@@ -1,4 +1,3 @@
-import tempfile
 import os
 import json
 import uuid
@@ -6,17 +5,34 @@ import asyncio
 
 from typing import Dict, Any
 from pathlib import Path
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, WebSocket, WebSocketDisconnect, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_community.llms import Tongyi
 
 from config.api_config import DASHSCOPE_API_KEY
-from src.common.utils import parse_pdf
+from src.common.pdf_pool import PdfParsePool, PoolSaturated
+from src.common.resume_cache import ResumeCache, prompt_version
+from src.common.upload import save_upload, check_content_length, UploadRejected
+from src.common.channel import SessionChannel
+from src.common.writer import get_writer, shutdown_writer
+from src.common import session_store
+from src.common.session_store import get_store
+from src.common.report_queue import load_reports, shutdown_report_queue
+from src.common.llm_cache import get_llm_cache
+from src.common.language_detect import detection_stats
+from src.common.score_index import get_score_index, save_score_index
 from src.logger.logger import LoggerConfig, LogLevel
 from src.state.state_machine import start_machine
+from src.llm.llm import close_async_client
+from src.llm.registry import warm_up
+from src.llm.router import latency_stats
+from src.llm.scheduler import get_scheduler
+from src.graph import graph
+from src.graph.graph import init_driver, init_async_driver, close_driver, close_async_driver, init_question_bank
 
 # 初始化日志
 logger_config = LoggerConfig(name="pdf_parser", base_dir="../../logs", log_level=LogLevel.DEBUG)
@@ -37,23 +53,190 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有请求头
 )
 
+# 上传请求在读取请求体之前先按Content-Length拒绝过大的文件，没有Content-Length的分块上传直接拒绝
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.method == "POST" and request.url.path.endswith("/upload-pdf"):
+        try:
+            check_content_length(request.headers.get("content-length"))
+        except UploadRejected as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    return await call_next(request)
+
+# 在本进程中运行状态机的会话（含channel等运行时对象），可共享的字段保存在会话存储中
 sessions: Dict[str, Dict[str, Any]] = {}
+pdf_pool: PdfParsePool = None
+background_tasks = set()
+# reaper检查过期会话的间隔（秒）
+reap_interval = 60
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def reap_sessions():
+    """清理长时间未上传简历的会话，结束其一直在等待的状态机"""
+    store = get_store()
+    while True:
+        await asyncio.sleep(reap_interval)
+        for session_id in await store.aexpired():
+            session = sessions.pop(session_id, None)
+            if session is not None:
+                session["task"].cancel()
+            await store.adelete(session_id)
+            logger.info(f"会话过期已清理: {session_id}")
+
+@app.on_event("startup")
+async def startup():
+    global pdf_pool
+    # 提示词变化后，旧版本的结构化结果不再可用，启动时直接清掉
+    resume_cache = ResumeCache()
+    resume_cache.invalidate(keep_version=prompt_version())
+    pdf_pool = PdfParsePool(cache=resume_cache)
+    run_in_background(reap_sessions())
+    # 预先创建共享的模型客户端
+    await asyncio.to_thread(warm_up)
+    # 加载得分索引，快照缺失时从会话目录重建
+    await asyncio.to_thread(get_score_index)
+
+    # 内存题库直接从JSON加载时不需要Neo4j
+    if graph.backend == "memory" and graph.question_bank_files:
+        await asyncio.to_thread(init_question_bank)
+    else:
+        # 预热题库连接池，避免第一个候选人承担建连开销
+        await asyncio.to_thread(init_driver)
+        await init_async_driver()
+        await asyncio.to_thread(init_question_bank)
+
+@app.on_event("shutdown")
+async def shutdown():
+    close_driver()
+    await close_async_driver()
+    await close_async_client()
+    pdf_pool.shutdown()
+    # 等进行中的报告生成完，再写完队列里剩余的文件
+    await asyncio.to_thread(shutdown_report_queue)
+    save_score_index()
+    # 写完队列里剩余的对话记录和报告再退出
+    await asyncio.to_thread(shutdown_writer)
 
 @app.get("/status/{session_id}")
 async def get_status(session_id: str):
-    if session_id not in sessions:
+    record = await get_store().aget(session_id)
+    if record is None:
         return {"error": "Session not found"}
+    local = sessions.get(session_id)
     return {
         "session_id": session_id,
-        "status": sessions[session_id]["current_state"],
-        "resume_path": sessions[session_id]["resume_path"],
-        "candidate_name": sessions[session_id]["candidate_name"]
+        "status": record["current_state"],
+        "resume_path": record["resume_path"],
+        "candidate_name": record["candidate_name"],
+        "ttft_ms": local["channel"].ttft_ms if local else None,
+        "parse_job": record["parse_job"]
     }
 
-# PDF上传解析API
-@app.post("/start-interview/{session_id}/upload-pdf")
-async def upload_pdf(session_id: str, file: UploadFile = File(...)):
+# 面试官消息的SSE推送，流式输出时逐token下发。推送只能由运行该会话的进程提供，多worker部署时需要会话粘滞
+@app.get("/sessions/{session_id}/stream")
+async def stream_messages(session_id: str):
+    if session_id not in sessions:
+        return JSONResponse({"error": "会话不存在或不在当前实例"}, status_code=404)
+
+    async def event_source():
+        async for event in sessions[session_id]["channel"].subscribe():
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_source(), media_type="text/event-stream")
+
+class AnswerRequest(BaseModel):
+    answer: str
+
+# 候选人提交一轮回答
+@app.post("/sessions/{session_id}/answer")
+async def submit_answer(session_id: str, request: AnswerRequest):
+    if session_id in sessions:
+        sessions[session_id]["channel"].put_answer(request.answer)
+        return {"success": True, "status": sessions[session_id]["current_state"]}
+
+    # 会话由其他进程运行时，经会话存储转交
+    record = await get_store().aget(session_id)
+    if record is None:
+        return JSONResponse({"error": "会话不存在"}, status_code=404)
+    await get_store().aput_message(session_id, "answer", request.answer)
+    return {"success": True, "status": record["current_state"]}
+
+# WebSocket双向通道：下发面试官消息，接收候选人回答（纯文本或{"answer": ...}）
+@app.websocket("/sessions/{session_id}/ws")
+async def interview_socket(websocket: WebSocket, session_id: str):
     if session_id not in sessions:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    channel = sessions[session_id]["channel"]
+
+    async def forward_events():
+        async for event in channel.subscribe():
+            await websocket.send_json(event)
+
+    sender = asyncio.create_task(forward_events())
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                answer = message["answer"] if isinstance(message, dict) else text
+            except (json.JSONDecodeError, KeyError):
+                answer = text
+            channel.put_answer(answer)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+
+async def process_resume(session_id: str, tmp_path: str, filename: str, pdf_hash: str = None, job: dict = None):
+    """解析上传的简历，保存结构化结果并通知状态机（状态机可能运行在其他进程）"""
+    store = get_store()
+
+    def progress(stage):
+        job["status"] = stage
+        run_in_background(store.aupdate(session_id, parse_job=job))
+
+    try:
+        result = await pdf_pool.parse(tmp_path, progress, pdf_hash)
+        candidate_name = result["基本信息"]["姓名"]
+
+        # 解析期间会话可能已被reaper清理
+        record = await store.aget(session_id)
+        if record is None:
+            raise RuntimeError("会话已过期或不存在")
+
+        json_save_path = os.path.join(record["save_path"]["root"], filename.split('.')[0] + '.json')
+        get_writer().write_json(json_save_path, result, indent=2)
+        # 其他进程会直接读文件，通知之前先确保落盘
+        await get_writer().aflush()
+
+        # 关键步骤：更新会话信息并发出通知
+        job["status"] = "done"
+        await store.aupdate(session_id, resume_path=json_save_path, candidate_name=candidate_name, parse_job=job)
+        await store.aput_message(session_id, "resume_uploaded")
+        return result
+    except Exception as e:
+        logger.error(f"PDF解析失败: {str(e)}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+        await store.aupdate(session_id, parse_job=job)
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+            logger.debug(f"清理临时文件: {tmp_path}")
+
+# PDF上传解析API，async_mode=true时立即返回job_id，解析进度通过/status查询
+@app.post("/start-interview/{session_id}/upload-pdf")
+async def upload_pdf(session_id: str, file: UploadFile = File(...), async_mode: bool = False):
+    if await get_store().aget(session_id) is None:
         return JSONResponse({"error": "会话不存在"}, status_code=404)
         
     logger.info(f"收到PDF上传请求: {file.filename}，会话ID: {session_id}")
@@ -61,42 +244,48 @@ async def upload_pdf(session_id: str, file: UploadFile = File(...)):
     if not file.filename.endswith('.pdf'):
         logger.warning(f"文件类型错误: {file.filename}")
         return JSONResponse({"error": "只支持PDF文件"}, status_code=400)
-    
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-        content = await file.read()
-        tmp.write(content)
-        tmp_path = tmp.name
-        logger.debug(f"临时文件创建: {tmp_path}")
+
+    try:
+        pdf_pool.acquire()
+    except PoolSaturated as e:
+        logger.warning(str(e))
+        return JSONResponse({"error": "简历解析繁忙，请稍后重试"}, status_code=429, headers={"Retry-After": "5"})
     
     try:
-        result = parse_pdf(tmp_path)
-        candidate_name = result["基本信息"]["姓名"]
-        
-        filename = file.filename.split('.')[0] + '.json'
-        save_path = sessions[session_id]["save_path"]["root"]
-        json_save_path = os.path.join(save_path, filename)
-        
-        with open(json_save_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        tmp_path, pdf_hash, size = await save_upload(file)
+        logger.debug(f"临时文件创建: {tmp_path}，大小: {size}，SHA-256: {pdf_hash}")
+    except UploadRejected as e:
+        pdf_pool.release()
+        logger.warning(f"拒绝上传 {file.filename}: {e}")
+        return JSONResponse({"error": str(e)}, status_code=e.status_code)
+    except Exception:
+        pdf_pool.release()
+        raise
 
-        # 关键步骤：更新会话信息并发出事件信号
-        sessions[session_id]["resume_path"] = json_save_path
-        sessions[session_id]["candidate_name"] = candidate_name
-        sessions[session_id]["resume_uploaded_event"].set()
-        
+    job_id = str(uuid.uuid4())
+    job = {"job_id": job_id, "status": "queued", "error": None}
+    await get_store().aupdate(session_id, parse_job=job)
+
+    if async_mode:
+        run_in_background(process_resume(session_id, tmp_path, file.filename, pdf_hash, job))
+        return JSONResponse({"success": True, "job_id": job_id, "status": "queued"}, status_code=202)
+    
+    try:
+        result = await process_resume(session_id, tmp_path, file.filename, pdf_hash, job)
         return JSONResponse({
             "success": True,
             "filename": file.filename,
             "parsed_resume": result
         })
     except Exception as e:
-        logger.error(f"PDF解析失败: {str(e)}")
         # 发生错误时，也要考虑是否要重置事件或状态
         return JSONResponse({"error": str(e)}, status_code=500)
-    finally:
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-            logger.debug(f"清理临时文件: {tmp_path}")
+
+async def relay_answers(session_id: str):
+    store = get_store()
+    while True:
+        answer = await store.get_message(session_id, "answer")
+        sessions[session_id]["channel"].put_answer(answer)
 
 @app.post("/start-interview")
 async def start_interview():
@@ -116,21 +305,75 @@ async def start_interview():
         "session_id": session_id,
         "candidate_name": None,
         "resume_path": None,
-        "resume_uploaded_event": asyncio.Event(),
         "save_path": {
             "root": save_path_root,
             "dialog": save_dialog_path,
             "summary": save_summary_path
         },
+        "channel": SessionChannel(asyncio.get_running_loop()),
+        "parse_job": None,
         "state_count": 0,
         "current_state": "not_started"
     }
+    await get_store().acreate(sessions[session_id])
+
+    task = asyncio.create_task(start_machine(sessions[session_id]))
+    sessions[session_id]["task"] = task
 
-    asyncio.create_task(start_machine(sessions[session_id]))
+    # 共享存储时，投递到其他进程的回答经存储转交给本进程的channel
+    if session_store.backend != "memory":
+        relay = run_in_background(relay_answers(session_id))
+        task.add_done_callback(lambda _: relay.cancel())
 
     return {"session_id": session_id, "message": "面试会话已创建"}
 
 
+# 面试报告的生成状态，已完成的报告附带内容
+@app.get("/sessions/{session_id}/reports")
+async def get_reports(session_id: str):
+    # 读取会话存储和报告文件都在线程中进行
+    reports = await asyncio.to_thread(load_reports, session_id)
+    if reports is None:
+        return JSONResponse({"error": "会话不存在"}, status_code=404)
+    return {"session_id": session_id, "reports": reports}
+
+# 跨会话的得分统计，可按报告类型、标签（语言、岗位）和时间范围（时间戳）筛选
+# 多个worker时先合并其他worker保存的快照，各worker的结果最多相差index_refresh_interval秒内的写入
+@app.get("/analytics/scores")
+async def score_analytics(kind: str = None, tag: str = None, since: float = None, until: float = None, bins: int = 10):
+    index = get_score_index()
+    await asyncio.to_thread(index.refresh)
+    filters = {"kind": kind, "tag": tag, "since": since, "until": until}
+    return {
+        "count": int(index.mask(**filters).sum()),
+        "percentiles": index.percentiles(q=(50, 75, 90, 99), **filters),
+        "histogram": index.histogram(bins=bins, **filters),
+        "tag_averages": index.tag_averages(**filters),
+    }
+
+@app.get("/cache/resume")
+async def resume_cache_stats():
+    return await asyncio.to_thread(pdf_pool.cache.stats)
+
+@app.get("/cache/llm")
+async def llm_cache_stats():
+    return get_llm_cache().stats()
+
+# 模型路由参考的各调用点延迟
+@app.get("/stats/llm-latency")
+async def llm_latency_stats():
+    return latency_stats()
+
+# LLM准入调度的排队深度、等待时间与令牌桶余量
+@app.get("/stats/llm-scheduler")
+async def llm_scheduler_stats():
+    return get_scheduler().stats()
+
+# 语言识别走本地快速路径的比例
+@app.get("/stats/language-detect")
+async def language_detect_stats():
+    return detection_stats()
+
 @app.get("/")
 async def root():
     logger.info("访问根路径")
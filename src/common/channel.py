@@ -0,0 +1,128 @@
+import time
+import asyncio
+
+
+class SessionChannel:
+    """
+    面试官与候选人之间的消息通道，每个会话一个。
+
+    面试官的话以事件的形式推送给所有订阅者（SSE/WebSocket连接）：
+        {"type": "token", "text": ...}                    流式输出的一个片段
+        {"type": "message", "text": ..., "ttft_ms": ...}  一句话结束，text为完整内容
+        {"type": "await_answer"}                          等待候选人回答
+    候选人的回答通过put_answer放入收件箱，面试流程await receive()取出。
+    publish和put_answer是线程安全的。
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.subscribers = set()
+        self.messages = []
+        self.ttft_ms = []
+        self.answers = asyncio.Queue()
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def publish(self, event):
+        if self._in_loop():
+            self._dispatch(event)
+        else:
+            self.loop.call_soon_threadsafe(self._dispatch, event)
+
+    def put_answer(self, text):
+        """收到候选人的回答"""
+        if self._in_loop():
+            self.answers.put_nowait(text)
+        else:
+            self.loop.call_soon_threadsafe(self.answers.put_nowait, text)
+
+    async def receive(self):
+        """等待候选人的下一条回答"""
+        self.publish({"type": "await_answer"})
+        text = await self.answers.get()
+        print(f"我：{text}")
+        return text
+
+    def _dispatch(self, event):
+        if event["type"] == "message":
+            self.messages.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    async def subscribe(self):
+        """订阅事件，先补发已经说完的话，再实时推送"""
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        try:
+            for event in list(self.messages):
+                yield event
+            while True:
+                yield await queue.get()
+        finally:
+            self.subscribers.discard(queue)
+
+    def say(self, text):
+        """面试官说一句完整的话"""
+        print(f"\n面试官：{text}")
+        self.publish({"type": "message", "text": text, "ttft_ms": None})
+        return text
+
+    def stream(self, chunks):
+        """
+        边生成边推送面试官的话
+
+        Args:
+            chunks: LLM流式输出的文本片段迭代器
+
+        Returns:
+            str: 拼接后的完整内容，用于写入对话记录
+        """
+        start = time.perf_counter()
+        ttft_ms = None
+        parts = []
+
+        print("\n面试官：", end="", flush=True)
+        for chunk in chunks:
+            text = str(chunk)
+            if not text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+            parts.append(text)
+            print(text, end="", flush=True)
+            self.publish({"type": "token", "text": text})
+        print()
+
+        full_text = "".join(parts)
+        if ttft_ms is not None:
+            self.ttft_ms.append(ttft_ms)
+        self.publish({"type": "message", "text": full_text, "ttft_ms": ttft_ms})
+        return full_text
+
+    async def astream(self, chunks):
+        """stream的异步版本，chunks为异步迭代器"""
+        start = time.perf_counter()
+        ttft_ms = None
+        parts = []
+
+        print("\n面试官：", end="", flush=True)
+        async for chunk in chunks:
+            text = str(chunk)
+            if not text:
+                continue
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - start) * 1000
+            parts.append(text)
+            print(text, end="", flush=True)
+            self.publish({"type": "token", "text": text})
+        print()
+
+        full_text = "".join(parts)
+        if ttft_ms is not None:
+            self.ttft_ms.append(ttft_ms)
+        self.publish({"type": "message", "text": full_text, "ttft_ms": ttft_ms})
+        return full_text
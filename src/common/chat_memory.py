@@ -0,0 +1,107 @@
+import threading
+
+from collections import OrderedDict
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.chat_history import BaseChatMessageHistory
+
+from src.common.utils import estimate_tokens
+
+# 同时保留对话上下文的会话数，超出后淘汰最久未使用的会话
+max_sessions = 500
+# 每次调用携带的历史消息token预算，以及早期对话摘要的token上限
+window_token_budget = 1500
+summary_token_budget = 300
+# 摘要中每条早期消息保留的字符数
+summary_chars_per_message = 60
+
+
+def compact_summary(summary, dropped_messages):
+    """
+    默认的摘要方式：每条被移出窗口的消息只保留开头部分，整体超出预算时丢弃最早的部分。
+    不调用LLM，不会给面试的关键路径增加延迟。
+    """
+    lines = [summary] if summary else []
+    for message in dropped_messages:
+        role = "候选人" if message.type == "human" else "面试官"
+        text = str(message.content).replace("\n", " ")
+        if len(text) > summary_chars_per_message:
+            text = text[:summary_chars_per_message] + "…"
+        lines.append(f"{role}：{text}")
+
+    summary = "\n".join(lines)
+    while estimate_tokens(summary) > summary_token_budget and "\n" in summary:
+        summary = summary.split("\n", 1)[1]
+    return summary
+
+
+class WindowedChatMessageHistory(BaseChatMessageHistory):
+    """
+    按token预算截取的对话历史：最近的消息原样保留，移出窗口的早期消息并入摘要后丢弃，
+    无论面试进行多久，每次调用携带的上下文和占用的内存都保持在预算之内。
+    """
+
+    def __init__(self, token_budget=None, summarizer=None):
+        self.token_budget = token_budget or window_token_budget
+        self.summarizer = summarizer or compact_summary
+        self.window = []
+        self.summary = ""
+
+    @property
+    def messages(self):
+        if self.summary:
+            return [SystemMessage(content=f"此前对话摘要：\n{self.summary}")] + self.window
+        return list(self.window)
+
+    def add_messages(self, messages):
+        self.window.extend(messages)
+        self._trim()
+
+    def _trim(self):
+        # 从最新的消息往前累计，超出预算的部分移入摘要，最新一条消息始终保留
+        total = 0
+        start = len(self.window)
+        for message in reversed(self.window):
+            total += estimate_tokens(str(message.content))
+            if total > self.token_budget and start < len(self.window):
+                break
+            start -= 1
+
+        if start > 0:
+            dropped, self.window = self.window[:start], self.window[start:]
+            self.summary = self.summarizer(self.summary, dropped)
+
+    def clear(self):
+        self.window = []
+        self.summary = ""
+
+
+class BoundedHistoryStore:
+    """
+    按会话保存对话上下文，最多保留max_sessions个会话，超出时淘汰最久未使用的，
+    会话结束时调用evict立即释放。
+    """
+
+    def __init__(self, max_sessions=None, factory=None):
+        self.max_sessions = max_sessions or globals()["max_sessions"]
+        self.factory = factory or WindowedChatMessageHistory
+        self.histories = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id) -> BaseChatMessageHistory:
+        with self.lock:
+            if session_id in self.histories:
+                self.histories.move_to_end(session_id)
+                return self.histories[session_id]
+
+            history = self.factory()
+            self.histories[session_id] = history
+            while len(self.histories) > self.max_sessions:
+                self.histories.popitem(last=False)
+            return history
+
+    def evict(self, session_id):
+        with self.lock:
+            self.histories.pop(session_id, None)
+
+    def __len__(self):
+        return len(self.histories)
@@ -4,16 +4,30 @@ import os
 from datetime import datetime
 from collections import OrderedDict
 
+from src.common.writer import get_writer
+
 class LocalChatHistory:
-    def __init__(self, session_id, file_path):
+    def __init__(self, session_id, file_path, journal=False, fsync_policy="turn"):
         """
         Initializes the chat history with a specific session_id.
         Args:
             session_id (str): A unique identifier for the chat session.
             file_path (str): The path to the JSON file for storing history.
+            journal (bool): Append one compact JSON line per change to a journal file
+                instead of rewriting the whole document; compacted at end_session.
+                Each record carries a sequence number and the compacted document stores
+                the last one as "journal_seq", so records it already covers are skipped
+                on replay if the journal outlives a compaction.
+            fsync_policy (str): When journal writes are fsynced: "turn" after every
+                record, "session" only when compacting at end_session, "never".
+                Journal records are appended and fsynced on the background writer thread.
         """
         self.file_path = file_path
+        self.journal_path = f"{file_path}.journal"
+        self.journal = journal
+        self.fsync_policy = fsync_policy
         self.session_id = session_id
+        self.journal_seq = 0
         self.history = OrderedDict([
             ("session_id", self.session_id),
             ("start_time", datetime.now().isoformat()),
@@ -25,15 +39,56 @@ class LocalChatHistory:
         self._load_history()
 
     def _load_history(self):
-        """Loads chat messages from the specified JSON file if it exists."""
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f, object_pairs_hook=OrderedDict)
-                    if data.get("session_id") == self.session_id:
-                        self.history = data
-            except (json.JSONDecodeError, FileNotFoundError):
-                pass  # Handles empty or corrupted files, will start with a fresh history.
+        """Loads chat messages from the JSON file and replays the journal if they exist."""
+        try:
+            data = get_writer().read_json(self.file_path, object_pairs_hook=OrderedDict)
+            if data and data.get("session_id") == self.session_id:
+                self.history = data
+        except (json.JSONDecodeError, FileNotFoundError):
+            pass  # Handles empty or corrupted files, will start with a fresh history.
+        self._replay_journal()
+
+    def _replay_journal(self):
+        """Applies journal records on top of the loaded history and cuts off a torn last line."""
+        writer = get_writer()
+        if writer.has_appends(self.journal_path):
+            writer.flush()
+        self.journal_seq = self.history.get("journal_seq", 0)
+        if not os.path.exists(self.journal_path):
+            return
+        covered = self.journal_seq
+        valid_size = 0
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'), object_pairs_hook=OrderedDict)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    break  # A crash mid-append leaves at most one partial line at the end.
+                valid_size += len(line)
+                seq = record.get("seq")
+                if seq is not None:
+                    self.journal_seq = max(self.journal_seq, seq)
+                    if seq <= covered:
+                        continue  # Already compacted into the document before a crash removed the journal.
+                if record["op"] == "meta":
+                    if record["data"].get("session_id") != self.session_id:
+                        return
+                    for key, value in record["data"].items():
+                        self.history[key] = value
+                elif record["op"] == "turn":
+                    self.history["conversations"].append(record["data"])
+
+        if valid_size < os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def _append_journal(self, op, data):
+        """Queues one journal record on the background writer, so no file I/O or fsync happens on the caller."""
+        self.journal_seq += 1
+        line = json.dumps({"seq": self.journal_seq, "op": op, "data": data}, ensure_ascii=False, separators=(',', ':'))
+        get_writer().append_line(self.journal_path, line, fsync=self.fsync_policy == "turn")
 
     def add_turn(self, user_message, ai_message):
         """Adds a new conversation turn (user and AI message) to the history."""
@@ -45,23 +100,42 @@ class LocalChatHistory:
             ("timestamp", datetime.now().isoformat())
         ])
         self.history["conversations"].append(turn)
-        self._save_history()
+        if self.journal:
+            self._append_journal("turn", turn)
+        else:
+            self._save_history()
+        return turn
 
     def end_session(self):
         """Records the end time for the chat session."""
         self.history["end_time"] = datetime.now().isoformat()
-        self._save_history()
+        if self.journal:
+            self._compact()
+        else:
+            self._save_history()
         print(f"Chat history saved to {self.file_path}")
 
         return self.file_path
 
     def _save_history(self):
-        """Saves the current chat history to the JSON file."""
+        """Queues the current chat history for the background writer, or appends its header fields to the journal."""
+        if self.journal:
+            header = OrderedDict((k, v) for k, v in self.history.items() if k not in ("conversations", "journal_seq"))
+            self._append_journal("meta", header)
+            return
         
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        with open(self.file_path, 'w', encoding='utf-8') as f:
-            json.dump(self.history, f, ensure_ascii=False, indent=4)
+        get_writer().write_json(self.file_path, self.history, indent=4)
         # print(f"Chat history saved to {self.file_path}")
+
+    def _compact(self):
+        """Queues the pretty JSON document for an atomic write; the journal is removed once it lands."""
+        def remove_journal():
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+
+        self.history["journal_seq"] = self.journal_seq
+        get_writer().write_json(self.file_path, self.history, indent=4,
+                                callback=remove_journal, fsync=self.fsync_policy != "never")
         
     def get_history(self):
         """Returns the complete chat history dictionary."""
@@ -0,0 +1,140 @@
+import re
+import threading
+import unicodedata
+
+# 本地识别的置信度达到该值时直接采用，不再调用LLM
+fast_path_confidence = 0.8
+
+# 规范名 -> 别名，别名全部小写
+LANGUAGE_ALIASES = {
+    "python": ["python", "python3", "py"],
+    "java": ["java", "jdk", "spring"],
+    "go": ["go", "golang", "go语言"],
+    "c++": ["c++", "cpp", "cplusplus", "c plus plus"],
+    "c": ["c", "c语言"],
+    "c#": ["c#", "csharp", ".net", "dotnet"],
+    "javascript": ["javascript", "js", "node", "nodejs", "node.js"],
+    "typescript": ["typescript", "ts"],
+    "rust": ["rust"],
+    "php": ["php"],
+    "kotlin": ["kotlin"],
+    "swift": ["swift"],
+    "ruby": ["ruby"],
+    "scala": ["scala"],
+}
+
+# c++版本号，兼容c++0x、c++1y这类早期写法
+CPP_VERSION = re.compile(r"(?:c\+\+|cpp)\s*(0x|1y|1z|2a|11|14|17|20|23)(?![0-9])")
+CPP_VERSION_ALIASES = {"0x": "11", "1y": "14", "1z": "17", "2a": "20"}
+# 追问c++新特性时表示不了解的回答
+CPP_NO_VERSION = re.compile(r"不了解|不太了解|没有|没了解|不清楚|不熟|不知道")
+# 表示否定的说法，出现时本地结果不可靠
+NEGATION = re.compile(r"不熟|不会|没用过|没学过|不太|不怎么|不是")
+
+
+def _alias_pattern(alias):
+    # 英文别名要求前后不是字母数字，避免"go"匹配到"google"、"c"匹配到"cpu"或"c++"
+    pattern = re.escape(alias)
+    if re.match(r"[a-z0-9.]", alias):
+        pattern = rf"(?<![a-z0-9+#.]){pattern}"
+    if re.search(r"[a-z0-9]$", alias):
+        pattern = rf"{pattern}(?![a-z0-9+#])"
+    return pattern
+
+
+_PATTERNS = {
+    language: re.compile("|".join(_alias_pattern(alias) for alias in sorted(aliases, key=len, reverse=True)))
+    for language, aliases in LANGUAGE_ALIASES.items()
+}
+
+
+def _normalize(text):
+    return unicodedata.normalize("NFKC", str(text)).lower()
+
+
+def resume_languages(value):
+    """把简历技术总结中的"语言"字段整理成规范名列表，字段可能是字符串或列表"""
+    if not value:
+        return []
+    items = value if isinstance(value, list) else re.split(r"[,，、/;；\s]+", str(value))
+    languages = []
+    for item in items:
+        found, _ = detect_language(item)
+        if found and found not in languages:
+            languages.append(found)
+    return languages
+
+
+def detect_cpp_version(text):
+    """从文本中识别c++版本，返回如"c++17"，没有版本号时返回None"""
+    match = CPP_VERSION.search(_normalize(text))
+    if not match:
+        return None
+    version = match.group(1)
+    return f"c++{CPP_VERSION_ALIASES.get(version, version)}"
+
+
+def detect_language(text, resume=None):
+    """
+    本地识别候选人表明熟悉的编程语言
+
+    Args:
+        text: 候选人的回答
+        resume: 简历技术总结中的语言，多个语言同时出现时优先取简历中有的
+
+    Returns:
+        tuple: (语言, 置信度)，语言为小写规范名，c++带版本时返回如"c++11"，无法识别时为(None, 0)
+    """
+    normalized = _normalize(text)
+    found = [language for language, pattern in _PATTERNS.items() if pattern.search(normalized)]
+    if "c++" not in found and CPP_VERSION.search(normalized):
+        found.append("c++")
+
+    if not found:
+        return None, 0.0
+
+    confidence = 0.9
+    if len(found) > 1:
+        preferred = [language for language in found if language in resume_languages(resume)]
+        if len(preferred) != 1:
+            return found[0], 0.3
+        found, confidence = preferred, 0.8
+
+    if NEGATION.search(normalized):
+        confidence = min(confidence, 0.5)
+
+    language = found[0]
+    if language == "c++":
+        language = detect_cpp_version(normalized) or language
+    return language, confidence
+
+
+def detect_cpp_refinement(text):
+    """
+    识别追问c++新特性时的回答
+
+    Returns:
+        tuple: (语言, 置信度)，有版本号时返回如"c++17"，明确表示不了解时返回"c++"
+    """
+    version = detect_cpp_version(text)
+    if version:
+        return version, 0.9
+    if CPP_NO_VERSION.search(_normalize(text)):
+        return "c++", 0.9
+    return None, 0.0
+
+
+_stats = {"fast_path": 0, "llm": 0}
+_stats_lock = threading.Lock()
+
+
+def record_detection(fast_path):
+    with _stats_lock:
+        _stats["fast_path" if fast_path else "llm"] += 1
+
+
+def detection_stats():
+    """本地识别直接命中与回退LLM的次数"""
+    with _stats_lock:
+        total = _stats["fast_path"] + _stats["llm"]
+        return dict(_stats, fast_path_rate=_stats["fast_path"] / total if total else 0.0)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+
+from collections import OrderedDict
+
+# 内存中保留的条目数和存活时间（秒）
+max_entries = 10000
+ttl_seconds = 24 * 3600
+# 磁盘缓存目录，为None时只使用内存缓存
+cache_dir = None
+
+# 归一化时去掉的首尾标点
+_PUNCTUATION = " \t\r\n。，！？、；：,.!?;:\"'“”‘’"
+
+
+def normalize_input(text):
+    """
+    归一化用户输入：全角转半角、转小写、合并空白、去掉中文旁的空格和首尾标点，
+    "我主要用Python。"与"我主要用 python"得到相同的结果
+    """
+    text = unicodedata.normalize("NFKC", str(text)).lower()
+    text = re.sub(r"\s+", " ", text)
+    # 中文前后的空格不影响含义
+    text = re.sub(r" ?([\u4e00-\u9fff]) ?", r"\1", text)
+    return text.strip(_PUNCTUATION)
+
+
+def cache_key(prompt, user_input):
+    """提示词的哈希与归一化输入的哈希组成缓存键"""
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    input_hash = hashlib.sha256(normalize_input(user_input).encode("utf-8")).hexdigest()[:32]
+    return f"{prompt_hash}_{input_hash}"
+
+
+class LLMCache:
+    """
+    LLM分类调用结果的缓存。
+
+    内存中按LRU保留最近的条目，可选的磁盘层每个条目一个JSON文件，进程重启后仍可命中。
+    条目超过存活时间后在读取时淘汰。只用于输出由输入决定的分类类调用，不用于生成追问。
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, directory=None):
+        self.max_entries = max_entries or globals()["max_entries"]
+        self.ttl_seconds = ttl_seconds or globals()["ttl_seconds"]
+        self.directory = directory or cache_dir
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """返回缓存的结果，未命中或已过期时返回None"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self.entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self.entries[key]
+
+        value = self._read_disk(key, now)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._put_memory(key, value, now + self.ttl_seconds)
+        return value
+
+    def put(self, key, value):
+        expires_at = time.time() + self.ttl_seconds
+        self._put_memory(key, value, expires_at)
+        self._write_disk(key, value, expires_at)
+
+    def _put_memory(self, key, value, expires_at):
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def _read_disk(self, key, now):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry["expires_at"] <= now:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return entry["value"]
+
+    def _write_disk(self, key, value, expires_at):
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"value": value, "expires_at": expires_at}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入LLM缓存失败: {e}")
+
+    def purge(self):
+        """清理过期条目，返回清理的数量"""
+        now = time.time()
+        removed = 0
+        with self.lock:
+            for key in [key for key, (_, expires_at) in self.entries.items() if expires_at <= now]:
+                del self.entries[key]
+                removed += 1
+
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json") and self._read_disk(name[:-len(".json")], now) is None:
+                    removed += 1
+        return removed
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+
+
+def get_llm_cache():
+    """获取进程内共享的LLM缓存"""
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
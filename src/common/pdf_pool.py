@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.common.utils import read_pdf, astructure_resume
+from src.common.resume_cache import file_sha256, prompt_version, default_prompt_path
+
+# 文本提取的进程数，以及允许同时排队/处理的简历数
+pdf_workers = 2
+pdf_max_pending = 8
+# 单份简历文本提取的时间预算（秒），超时返回已提取的部分
+pdf_time_budget = 20
+
+
+class PoolSaturated(Exception):
+    """解析队列已满，调用方应返回429"""
+
+
+class PdfExtractError(Exception):
+    """PDF文本提取失败，解析任务记为失败，不再交给LLM结构化"""
+
+
+class PdfParsePool:
+    """
+    简历解析池：PDF文本提取在进程池中执行，LLM结构化步骤异步执行，
+    同时在途的任务数超过max_pending时直接拒绝。
+    进程池中有工作进程异常退出（如解析恶意PDF时被OOM kill）时重建进程池，当前任务记为失败。
+    """
+
+    def __init__(self, workers=None, max_pending=None, cache=None, prompt_path=default_prompt_path):
+        self.workers = workers or pdf_workers
+        self.max_pending = max_pending or pdf_max_pending
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.executor_lock = threading.Lock()
+        self.pending = 0
+        self.cache = cache
+        self.prompt_path = prompt_path
+
+    def acquire(self):
+        """占用一个排队名额，队列已满时抛出PoolSaturated"""
+        if self.pending >= self.max_pending:
+            raise PoolSaturated(f"简历解析队列已满（{self.pending}/{self.max_pending}）")
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+
+    async def parse(self, pdf_path, progress=None, pdf_hash=None):
+        """
+        解析一份简历，调用前需要先acquire
+
+        Args:
+            pdf_path: PDF文件路径
+            progress: 可选回调，参数为当前阶段："extracting"、"structuring"
+            pdf_hash: PDF内容的SHA-256，不传时在需要缓存的情况下现算
+
+        Returns:
+            dict: 结构化的简历
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            version = None
+            if self.cache is not None:
+                # 缓存的读写都访问磁盘，放到线程中执行
+                if pdf_hash is None:
+                    pdf_hash = await loop.run_in_executor(None, file_sha256, pdf_path)
+                version = await loop.run_in_executor(None, prompt_version, self.prompt_path)
+                resume = await loop.run_in_executor(None, self.cache.get_resume, pdf_hash, version)
+                if resume is not None:
+                    return resume
+
+            pdf_text = None
+            if self.cache is not None:
+                pdf_text = await loop.run_in_executor(None, self.cache.get_text, pdf_hash)
+            if pdf_text is None:
+                if progress:
+                    progress("extracting")
+                # 按页拆分到进程池并行提取，等待结果的线程不占用事件循环
+                executor = self.executor
+                try:
+                    pdf_text = await loop.run_in_executor(None, functools.partial(
+                        read_pdf, pdf_path, parallel=True, workers=self.workers,
+                        time_budget=pdf_time_budget, executor=executor
+                    ))
+                except BrokenProcessPool:
+                    self._reset_executor(executor)
+                    raise PdfExtractError("PDF文本提取进程异常退出")
+                # read_pdf出错时返回的是错误信息，不能缓存，也不能当作简历内容结构化
+                if pdf_text.startswith("处理 PDF 时发生错误"):
+                    raise PdfExtractError(pdf_text)
+                if self.cache is not None:
+                    await loop.run_in_executor(None, self.cache.put_text, pdf_hash, pdf_text)
+
+            if progress:
+                progress("structuring")
+            resume = await astructure_resume(pdf_text, self.prompt_path)
+            if self.cache is not None:
+                await loop.run_in_executor(None, self.cache.put_resume, pdf_hash, version, resume)
+            return resume
+        finally:
+            self.release()
+
+    def _reset_executor(self, broken):
+        """替换已损坏的进程池，多个任务同时发现时只重建一次"""
+        with self.executor_lock:
+            if self.executor is not broken:
+                return
+            print("PDF提取进程池已损坏，重新创建")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,182 @@
+import time
+import asyncio
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.exceptions import OutputParserException
+
+from src.common.session_store import get_store
+from src.common.writer import get_writer
+
+# 并行生成报告的线程数，以及JSON解析失败时的重试次数
+report_workers = 4
+report_max_retries = 2
+
+
+class ReportQueue:
+    """
+    面试报告的后台生成队列。
+
+    每个报告以report_id标识，与summary目录下的文件名一致（如"theory"、"project_xxx"），
+    各报告互不依赖，在线程池中并行生成。LLM输出无法解析为JSON时重试，
+    其他异常或生成函数没有返回内容时记为失败。
+    报告状态同步到会话存储，其他进程也能查询；会话的报告全部结束后从内存中移除，之后再提交时从会话存储恢复。
+    """
+
+    def __init__(self, workers=None, max_retries=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers or report_workers, thread_name_prefix="report")
+        # 同步到会话存储的写入都交给这一个线程按提交顺序执行，不占用事件循环，也不在持有self.lock时访问存储
+        self.sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-sync")
+        self.max_retries = report_max_retries if max_retries is None else max_retries
+        self.jobs = {}
+        self.futures = {}
+        self.unrestored = set()
+        self.lock = threading.Lock()
+
+    def submit(self, session_id, report_id, func, *args):
+        """
+        提交一个报告任务，只修改内存中的状态，可以在事件循环中直接调用
+
+        Args:
+            session_id: 会话ID
+            report_id: 报告ID，同时是summary目录下的文件名（不含.json）
+            func: 报告生成函数，返回报告内容，JSON解析失败时抛出OutputParserException，返回空值视为失败
+            *args: 传给func的参数
+        """
+        job = {
+            "report_id": report_id,
+            "status": "queued",
+            "attempts": 0,
+            "error": None,
+            "submitted_at": time.time(),
+            "finished_at": None,
+        }
+        with self.lock:
+            if session_id not in self.jobs:
+                self.jobs[session_id] = OrderedDict()
+                self.unrestored.add(session_id)
+            self.jobs[session_id][report_id] = job
+            future = self.executor.submit(self._run, session_id, job, func, args)
+            self.futures.setdefault(session_id, []).append(future)
+        self.sync_executor.submit(self._sync, session_id)
+        # 在同步线程中移除，排在这个报告最后一次状态同步之后
+        future.add_done_callback(lambda f: self.sync_executor.submit(self._prune, session_id, f))
+        return job
+
+    def _restore(self, session_id):
+        """从会话存储恢复已经移出内存的报告状态，排在本次提交的报告之前，避免同步时覆盖之前的报告"""
+        record = get_store().get(session_id) or {}
+        with self.lock:
+            self.unrestored.discard(session_id)
+            current = self.jobs.get(session_id)
+            if current is None:
+                return
+            restored = OrderedDict(
+                (job["report_id"], job) for job in record.get("reports") or [] if job["report_id"] not in current
+            )
+            restored.update(current)
+            self.jobs[session_id] = restored
+
+    def _prune(self, session_id, future):
+        """报告结束后移除future，会话没有进行中的报告时移除其状态，在同步线程中执行"""
+        with self.lock:
+            futures = self.futures.get(session_id, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self.futures.pop(session_id, None)
+                self.jobs.pop(session_id, None)
+                self.unrestored.discard(session_id)
+
+    def _run(self, session_id, job, func, args):
+        for attempt in range(1, self.max_retries + 2):
+            self._set(session_id, job, status="running", attempts=attempt)
+            try:
+                result = func(*args)
+                if not result:
+                    print(f"报告{job['report_id']}生成失败: 没有返回内容")
+                    self._set(session_id, job, error="报告生成函数没有返回内容")
+                    break
+                self._set(session_id, job, status="done", error=None, finished_at=time.time())
+                return
+            except OutputParserException as e:
+                print(f"报告{job['report_id']}第{attempt}次生成的JSON无法解析: {e}")
+                self._set(session_id, job, error=str(e))
+            except Exception as e:
+                print(f"报告{job['report_id']}生成失败: {e}")
+                self._set(session_id, job, error=str(e))
+                break
+        self._set(session_id, job, status="failed", finished_at=time.time())
+
+    def _set(self, session_id, job, **fields):
+        with self.lock:
+            job.update(fields)
+        self.sync_executor.submit(self._sync, session_id)
+
+    def _sync(self, session_id):
+        """把会话当前的报告状态写入会话存储，在同步线程中执行，读取状态时才持有锁"""
+        if session_id in self.unrestored:
+            self._restore(session_id)
+        with self.lock:
+            jobs = self.jobs.get(session_id)
+            if jobs is None:
+                return
+            reports = [dict(job) for job in jobs.values()]
+        try:
+            get_store().update(session_id, reports=reports)
+        except Exception as e:
+            print(f"同步会话{session_id}的报告状态失败: {e}")
+
+    async def wait(self, session_id):
+        """等待会话已提交的报告全部结束"""
+        with self.lock:
+            futures = list(self.futures.get(session_id, []))
+        if futures:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        # 等之前的状态同步写入会话存储
+        await asyncio.wrap_future(self.sync_executor.submit(lambda: None))
+
+    def shutdown(self):
+        """等待进行中的报告生成完毕，状态全部写入会话存储"""
+        self.executor.shutdown(wait=True)
+        self.sync_executor.shutdown(wait=True)
+
+
+def load_reports(session_id):
+    """
+    读取会话的报告状态，已完成的报告附带内容
+
+    Returns:
+        list: 每个报告的状态，status为done时包含result
+    """
+    record = get_store().get(session_id)
+    if record is None:
+        return None
+
+    reports = []
+    for job in record.get("reports") or []:
+        job = dict(job)
+        if job["status"] == "done":
+            summary_path = f"{record['save_path']['summary']}/{job['report_id']}.json"
+            job["result"] = get_writer().read_json(summary_path)
+        reports.append(job)
+    return reports
+
+
+_queue = None
+
+
+def get_report_queue():
+    """获取进程内共享的报告队列"""
+    global _queue
+    if _queue is None:
+        _queue = ReportQueue()
+    return _queue
+
+
+def shutdown_report_queue():
+    global _queue
+    if _queue is not None:
+        _queue.shutdown()
+        _queue = None
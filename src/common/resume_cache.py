@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+default_prompt_path = "./data/prompt/parse_pdf.yaml"
+
+# 缓存目录与淘汰策略
+cache_dir = "./data/cache/resume"
+max_entries = 2000
+max_bytes = 200 * 1024 * 1024
+max_age_seconds = 30 * 24 * 3600
+# 条目大小在内存中增量维护，每隔该时间（秒）重新扫描一次目录，纳入其他进程写入的条目
+rescan_interval = 10 * 60
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def prompt_version(prompt_path=default_prompt_path):
+    """
+    简历解析提示词的版本号，提示词内容变化时版本号随之变化
+    """
+    with open(prompt_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class ResumeCache:
+    """
+    以PDF内容的SHA-256为键的简历解析缓存，存在本地目录中。
+
+    提取的文本只和PDF有关，保存为 {pdf_hash}.txt；
+    结构化结果还和提示词版本有关，保存为 {pdf_hash}_{prompt_version}.json。
+    按条目数、总大小和存活时间淘汰，最久未使用的先淘汰。
+    各条目的大小和最近使用时间在内存中维护，写入时只有超出限制才淘汰，不需要每次扫描目录；
+    读写都访问磁盘，协程中应放到线程中调用。
+    """
+
+    def __init__(self, directory=None, max_entries=None, max_bytes=None, max_age_seconds=None):
+        self.directory = directory or cache_dir
+        self.max_entries = max_entries or globals()["max_entries"]
+        self.max_bytes = max_bytes or globals()["max_bytes"]
+        self.max_age_seconds = max_age_seconds or globals()["max_age_seconds"]
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.index = {}
+        self.total_bytes = 0
+        self.scanned_at = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read(self, name):
+        path = self._path(name)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                self._remove(name)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            # 更新修改时间，作为最近使用时间
+            os.utime(path)
+            with self.lock:
+                if name in self.index:
+                    self.index[name] = (time.time(), self.index[name][1])
+            return content
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _write(self, name, content):
+        path = self._path(name)
+        # 同一进程的多个线程可能同时写同一条目，临时文件名带上进程和线程编号
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # 缓存写入失败不影响解析结果
+            print(f"写入简历缓存 {name} 失败: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        with self.lock:
+            self._track(name, time.time(), size)
+            over = len(self.index) > self.max_entries or self.total_bytes > self.max_bytes
+        if over or time.time() - self.scanned_at > rescan_interval:
+            self.evict()
+
+    def _track(self, name, mtime, size):
+        """更新内存中的条目信息，需持有self.lock"""
+        previous = self.index.get(name)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+        self.index[name] = (mtime, size)
+        self.total_bytes += size
+
+    def _untrack(self, name):
+        """需持有self.lock"""
+        previous = self.index.pop(name, None)
+        if previous is not None:
+            self.total_bytes -= previous[1]
+
+    def _rescan(self):
+        """重新扫描目录，纳入其他进程写入或删除的条目"""
+        entries = self._entries()
+        with self.lock:
+            self.index = {name: (mtime, size) for mtime, size, name in entries}
+            self.total_bytes = sum(size for _, size, _ in entries)
+            self.scanned_at = time.time()
+
+    def get_text(self, pdf_hash):
+        return self._read(f"{pdf_hash}.txt")
+
+    def put_text(self, pdf_hash, text):
+        self._write(f"{pdf_hash}.txt", text)
+
+    def get_resume(self, pdf_hash, version):
+        content = self._read(f"{pdf_hash}_{version}.json")
+        if content is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(content)
+
+    def put_resume(self, pdf_hash, version, resume):
+        self._write(f"{pdf_hash}_{version}.json", json.dumps(resume, ensure_ascii=False))
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(self._path(name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        """删除过期条目，然后按最近使用时间淘汰，直到条目数和总大小都在限制内"""
+        if time.time() - self.scanned_at > rescan_interval:
+            self._rescan()
+
+        now = time.time()
+        with self.lock:
+            entries = sorted((mtime, size, name) for name, (mtime, size) in self.index.items())
+            total = self.total_bytes
+        expired = [entry for entry in entries if now - entry[0] > self.max_age_seconds]
+        entries = [entry for entry in entries if now - entry[0] <= self.max_age_seconds]
+        total -= sum(size for _, size, _ in expired)
+        removed = [name for _, _, name in expired]
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, name = entries.pop(0)
+            removed.append(name)
+            total -= size
+
+        for name in removed:
+            self._remove(name)
+
+    def _remove(self, name):
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"删除简历缓存 {name} 失败: {e}")
+            return
+        with self.lock:
+            self._untrack(name)
+
+    def invalidate(self, keep_version=None):
+        """
+        删除结构化结果缓存，提示词修改后调用
+
+        Args:
+            keep_version: 保留该提示词版本的结果，None表示全部删除
+
+        Returns:
+            int: 删除的条目数
+        """
+        removed = 0
+        for _, _, name in self._entries():
+            if not name.endswith('.json'):
+                continue
+            if keep_version is not None and name.endswith(f"_{keep_version}.json"):
+                continue
+            self._remove(name)
+            removed += 1
+        return removed
+
+    def stats(self):
+        """命中率与条目统计，条目数和大小取自内存中维护的信息，不扫描目录"""
+        if not self.scanned_at:
+            self._rescan()
+        lookups = self.hits + self.misses
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.index),
+                "bytes": self.total_bytes,
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="简历解析缓存管理")
+    parser.add_argument("--invalidate", action="store_true", help="删除与当前提示词版本不一致的结构化结果")
+    parser.add_argument("--all", action="store_true", help="与--invalidate一起使用，删除所有结构化结果")
+    parser.add_argument("--prompt", default=default_prompt_path)
+    args = parser.parse_args()
+
+    cache = ResumeCache()
+    if args.invalidate:
+        keep = None if args.all else prompt_version(args.prompt)
+        print(f"已删除{cache.invalidate(keep)}条结构化结果缓存")
+    print(cache.stats())
@@ -0,0 +1,449 @@
+import os
+import re
+import glob
+import json
+import time
+import threading
+
+import numpy as np
+
+# 索引快照文件，以及累计多少次写入后保存一次快照。
+# 多个worker各自保存为score_index.<pid>.npz，启动时合并目录下所有快照
+score_index_path = "./data/score_index.npz"
+index_save_every = 100
+# 查询时最多每隔该时间（秒）重新合并一次其他worker的快照
+index_refresh_interval = 30
+# 重建索引时扫描的会话目录
+session_history_root = "./data/session_history"
+
+# 数值列及其类型
+COLUMNS = {
+    "session": np.int32,      # 会话ID在sessions中的编号
+    "kind": np.int8,          # 报告类型在kinds中的编号
+    "created_at": np.float64,
+    "score": np.float32,      # 逐轮平均分
+    "total": np.float32,      # 逐轮总分
+    "full_score": np.float32,
+    "turns": np.int16,
+}
+
+
+def report_kind(report_id):
+    """报告ID对应的报告类型，如"theory"、"project_xxx"分别为theory、project"""
+    return report_id.split("_", 1)[0]
+
+
+class ScoreIndex:
+    """
+    跨会话的报告得分索引。
+
+    每个报告一行，数值按列保存在numpy数组中，统计时对整列做向量化计算；
+    会话ID、报告类型、标签等字符串做字典编码，只在列中保存编号。
+    标签（语言、岗位等）与报告是多对多关系，单独保存为(行号, 标签编号)两列。
+    报告写入时调用add更新索引，周期性保存为npz快照；快照缺失时可从会话目录重建。
+    每个进程只写自己的快照文件，加载时合并所有进程的快照，同一报告保留生成时间最新的一份；
+    查询前调用refresh重新合并其他进程更新过的快照，各worker返回的统计最多相差一个刷新周期和未保存的写入。
+    """
+
+    def __init__(self, path=None, capacity=1024):
+        self.base_path = path or score_index_path
+        root, ext = os.path.splitext(self.base_path)
+        self.path = f"{root}.{os.getpid()}{ext}"
+        self.lock = threading.Lock()
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.tag_size = 0
+        self.tag_columns = {name: np.zeros(capacity, dtype=np.int32) for name in ("tag_rows", "tag_ids")}
+        self.sessions, self.kinds, self.tags = [], [], []
+        self.codes = {"sessions": {}, "kinds": {}, "tags": {}}
+        self.report_ids, self.evaluations = [], []
+        self.rows = {}
+        self.unsaved = 0
+        self.saved_at = time.time()
+        # 已合并的快照文件 -> 合并时的修改时间
+        self.merged = {}
+        self.refreshed_at = 0
+
+    def _code(self, table, value):
+        codes = self.codes[table]
+        if value not in codes:
+            codes[value] = len(codes)
+            getattr(self, table).append(value)
+        return codes[value]
+
+    @staticmethod
+    def _grow(columns, size, needed):
+        # 容量按倍数扩展，追加的均摊开销为常数
+        capacity = len(next(iter(columns.values())))
+        if size + needed <= capacity:
+            return
+        capacity = max(capacity * 2, size + needed)
+        for name, column in columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:size] = column[:size]
+            columns[name] = grown
+
+    @property
+    def tag_rows(self):
+        return self.tag_columns["tag_rows"][:self.tag_size]
+
+    @property
+    def tag_ids(self):
+        return self.tag_columns["tag_ids"][:self.tag_size]
+
+    def add(self, session_id, report_id, scores_by_turn, tags=(), evaluation="", created_at=None):
+        """
+        写入或覆盖一个报告的得分
+
+        Args:
+            session_id: 会话ID
+            report_id: 报告ID，如"theory"、"project_xxx"
+            scores_by_turn: 报告中的逐轮评分
+            tags: 该会话的标签，如编程语言、岗位
+            evaluation: 报告的总体评估
+            created_at: 报告生成时间，默认当前时间
+        """
+        scores = [score["score"] for score in scores_by_turn]
+        values = {
+            "created_at": created_at or time.time(),
+            "score": sum(scores) / len(scores) if scores else np.nan,
+            "total": sum(scores),
+            "full_score": scores_by_turn[-1]["turn_id"] * 10 if scores_by_turn else 0,
+            "turns": len(scores),
+        }
+        with self.lock:
+            self._put(session_id, report_id, values, tags, evaluation)
+            self.unsaved += 1
+            # 超过刷新周期也保存，其他worker刷新时能看到本进程最近的写入
+            if self.unsaved >= index_save_every or time.time() - self.saved_at >= index_refresh_interval:
+                self._save()
+
+    def _put(self, session_id, report_id, values, tags, evaluation):
+        """写入一行，需持有self.lock"""
+        row = self.rows.get((session_id, report_id))
+        if row is None:
+            self._grow(self.columns, self.size, 1)
+            row = self.size
+            self.size += 1
+            self.rows[(session_id, report_id)] = row
+            self.report_ids.append(report_id)
+            self.evaluations.append(evaluation)
+        else:
+            # 报告重新生成，去掉旧的标签
+            keep = self.tag_rows != row
+            kept = int(keep.sum())
+            for name in self.tag_columns:
+                self.tag_columns[name][:kept] = self.tag_columns[name][:self.tag_size][keep]
+            self.tag_size = kept
+            self.evaluations[row] = evaluation
+
+        values = dict(values, session=self._code("sessions", session_id), kind=self._code("kinds", report_kind(report_id)))
+        for name, value in values.items():
+            self.columns[name][row] = value
+
+        tag_ids = sorted({self._code("tags", tag) for tag in tags})
+        self._grow(self.tag_columns, self.tag_size, len(tag_ids))
+        end = self.tag_size + len(tag_ids)
+        self.tag_columns["tag_rows"][self.tag_size:end] = row
+        self.tag_columns["tag_ids"][self.tag_size:end] = tag_ids
+        self.tag_size = end
+
+    def column(self, name):
+        return self.columns[name][:self.size]
+
+    def mask(self, kind=None, tag=None, since=None, until=None, session_id=None):
+        """按条件筛选报告，返回布尔数组"""
+        with self.lock:
+            return self._mask(kind, tag, since, until, session_id)
+
+    def _mask(self, kind=None, tag=None, since=None, until=None, session_id=None):
+        """mask的实现，需持有self.lock，与读取列的操作在同一次加锁内完成，避免并发add改变行数"""
+        mask = np.ones(self.size, dtype=bool)
+        if kind is not None:
+            mask &= self.column("kind") == self.codes["kinds"].get(kind, -1)
+        if session_id is not None:
+            mask &= self.column("session") == self.codes["sessions"].get(session_id, -1)
+        if since is not None:
+            mask &= self.column("created_at") >= since
+        if until is not None:
+            mask &= self.column("created_at") < until
+        if tag is not None:
+            tagged = np.zeros(self.size, dtype=bool)
+            tagged[self.tag_rows[self.tag_ids == self.codes["tags"].get(tag, -1)]] = True
+            mask &= tagged
+        # 没有评分的报告不参与统计
+        return mask & ~np.isnan(self.column("score"))
+
+    def _scores(self, **filters):
+        with self.lock:
+            return self.column("score")[self._mask(**filters)]
+
+    def percentiles(self, q=(50, 90), **filters):
+        """
+        筛选出的报告平均分的分位数
+
+        Returns:
+            dict: 分位数 -> 分数，没有数据时为None
+        """
+        scores = self._scores(**filters)
+        if scores.size == 0:
+            return {p: None for p in q}
+        return {p: float(v) for p, v in zip(q, np.percentile(scores, q))}
+
+    def histogram(self, bins=10, **filters):
+        """筛选出的报告平均分在0-10分上的直方图"""
+        counts, edges = np.histogram(self._scores(**filters), bins=bins, range=(0, 10))
+        return {"counts": counts.tolist(), "edges": edges.tolist()}
+
+    def tag_averages(self, **filters):
+        """筛选出的报告按标签分组的平均分和报告数"""
+        with self.lock:
+            mask = self._mask(**filters)
+            selected = mask[self.tag_rows]
+            rows, ids = self.tag_rows[selected], self.tag_ids[selected]
+            sums = np.bincount(ids, weights=self.column("score")[rows], minlength=len(self.tags))
+            counts = np.bincount(ids, minlength=len(self.tags))
+            return {
+                tag: {"average": float(sums[i] / counts[i]), "count": int(counts[i])}
+                for i, tag in enumerate(self.tags) if counts[i]
+            }
+
+    def session_reports(self, session_id, kind=None):
+        """会话中各报告的得分，按写入顺序返回"""
+        with self.lock:
+            rows = np.flatnonzero(self._mask(session_id=session_id, kind=kind))
+            return [
+                {
+                    "report_id": self.report_ids[row],
+                    "score": float(self.columns["score"][row]),
+                    "total": float(self.columns["total"][row]),
+                    "full_score": float(self.columns["full_score"][row]),
+                    "turns": int(self.columns["turns"][row]),
+                    "evaluation": self.evaluations[row],
+                }
+                for row in rows
+            ]
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        # 字符串表编码为JSON字节存进同一个npz文件，快照整体原子替换
+        strings = json.dumps({
+            "sessions": self.sessions,
+            "kinds": self.kinds,
+            "tags": self.tags,
+            "report_ids": self.report_ids,
+            "evaluations": self.evaluations,
+        }, ensure_ascii=False).encode("utf-8")
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                tag_rows=self.tag_rows,
+                tag_ids=self.tag_ids,
+                strings=np.frombuffer(strings, dtype=np.uint8),
+                **{name: self.column(name) for name in COLUMNS},
+            )
+        os.replace(tmp_path, self.path)
+        self.unsaved = 0
+        self.saved_at = time.time()
+
+    def _snapshot_paths(self):
+        """所有进程的快照（包括旧版本的单个快照文件），按修改时间从新到旧"""
+        root, ext = os.path.splitext(self.base_path)
+        pattern = re.compile(re.escape(root) + r"(\.\d+)?" + re.escape(ext) + "$")
+        paths = [path for path in glob.glob(f"{glob.escape(root)}*{ext}") if pattern.match(path)]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    @staticmethod
+    def _read_snapshot(path):
+        try:
+            with np.load(path) as data:
+                strings = json.loads(data["strings"].tobytes().decode("utf-8"))
+                columns = {name: data[name] for name in COLUMNS}
+                tag_rows, tag_ids = data["tag_rows"], data["tag_ids"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取得分索引 {path} 失败: {e}")
+            return None
+        return strings, columns, tag_rows, tag_ids
+
+    def load(self):
+        """
+        读取并合并所有进程的快照，返回是否成功
+
+        合并了其他进程的快照时立即保存本进程的快照，之后删除已合并且没有再被修改的快照文件
+        """
+        loaded = []
+        for path in self._snapshot_paths():
+            mtime = os.path.getmtime(path)
+            snapshot = self._read_snapshot(path)
+            if snapshot is None:
+                continue
+            with self.lock:
+                if self.size == 0:
+                    self._load_snapshot(*snapshot)
+                else:
+                    self._merge_snapshot(*snapshot)
+            loaded.append((path, mtime))
+        self.refreshed_at = time.time()
+        if not loaded:
+            return False
+
+        if any(path != self.path for path, _ in loaded):
+            self.save()
+            for path, mtime in loaded:
+                try:
+                    if path != self.path and os.path.getmtime(path) == mtime:
+                        os.remove(path)
+                        continue
+                except OSError:
+                    continue
+                self.merged[path] = mtime
+        return True
+
+    def refresh(self, force=False):
+        """
+        保存本进程未保存的写入，并合并其他进程上次合并之后更新过的快照，供查询前调用
+
+        距上次刷新不足index_refresh_interval时直接返回，不删除其他进程的快照文件
+
+        Returns:
+            int: 本次合并的快照数
+        """
+        now = time.time()
+        if not force and now - self.refreshed_at < index_refresh_interval:
+            return 0
+        self.refreshed_at = now
+
+        with self.lock:
+            if self.unsaved:
+                self._save()
+
+        merged = 0
+        for path in self._snapshot_paths():
+            if path == self.path:
+                continue
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if self.merged.get(path) == mtime:
+                continue
+            snapshot = self._read_snapshot(path)
+            if snapshot is None:
+                continue
+            with self.lock:
+                self._merge_snapshot(*snapshot)
+            self.merged[path] = mtime
+            merged += 1
+        return merged
+
+    def _load_snapshot(self, strings, columns, tag_rows, tag_ids):
+        """把快照整体载入空索引，需持有self.lock"""
+        self.size = len(columns["session"])
+        capacity = max(self.size, len(self.columns["session"]))
+        for name, column in columns.items():
+            self.columns[name] = np.zeros(capacity, dtype=COLUMNS[name])
+            self.columns[name][:self.size] = column
+        self.tag_size = len(tag_rows)
+        self.tag_columns = {"tag_rows": tag_rows.astype(np.int32), "tag_ids": tag_ids.astype(np.int32)}
+        for table in ("sessions", "kinds", "tags"):
+            setattr(self, table, strings[table])
+            self.codes[table] = {value: i for i, value in enumerate(strings[table])}
+        self.report_ids, self.evaluations = strings["report_ids"], strings["evaluations"]
+        session_codes = self.columns["session"]
+        self.rows = {
+            (self.sessions[session_codes[row]], report_id): row
+            for row, report_id in enumerate(self.report_ids)
+        }
+
+    def _merge_snapshot(self, strings, columns, tag_rows, tag_ids):
+        """把其他进程的快照逐行合并进来，同一报告保留生成时间更新的一份，需持有self.lock"""
+        row_tags = {}
+        for row, tag_id in zip(tag_rows.tolist(), tag_ids.tolist()):
+            row_tags.setdefault(row, []).append(strings["tags"][tag_id])
+
+        for row, report_id in enumerate(strings["report_ids"]):
+            session_id = strings["sessions"][columns["session"][row]]
+            existing = self.rows.get((session_id, report_id))
+            if existing is not None and self.columns["created_at"][existing] >= columns["created_at"][row]:
+                continue
+            values = {name: columns[name][row] for name in ("created_at", "score", "total", "full_score", "turns")}
+            self._put(session_id, report_id, values, row_tags.get(row, ()), strings["evaluations"][row])
+
+    def rebuild(self, root=None):
+        """
+        扫描所有会话目录重建索引，只在快照缺失或损坏时使用
+
+        会话的标签取自理论面试对话记录中的语言和岗位
+        """
+        root = root or session_history_root
+        if not os.path.isdir(root):
+            return
+        for session_id in os.listdir(root):
+            summary_dir = os.path.join(root, session_id, "summary")
+            if not os.path.isdir(summary_dir):
+                continue
+
+            tags = []
+            theory_dialog = os.path.join(root, session_id, "dialog", "theory.json")
+            if os.path.exists(theory_dialog):
+                with open(theory_dialog, "r", encoding="utf-8") as f:
+                    topic = json.load(f).get("topic") or {}
+                tags = [topic.get("coding_language")] + list(topic.get("potential_position") or [])
+
+            for file in os.listdir(summary_dir):
+                if not file.endswith(".json"):
+                    continue
+                file_path = os.path.join(summary_dir, file)
+                try:
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        report = json.load(f)
+                    self.add(
+                        session_id, file[:-len(".json")], report["scores_by_turn"],
+                        tags=[tag for tag in tags if tag],
+                        evaluation=report["summary"].get("overall_evaluation", ""),
+                        created_at=os.path.getmtime(file_path),
+                    )
+                except (json.JSONDecodeError, KeyError, TypeError) as e:
+                    print(f"跳过无法解析的报告 {file_path}: {e}")
+        self.save()
+
+    def __len__(self):
+        return self.size
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_score_index():
+    """获取进程内共享的得分索引，首次使用时读取快照，读取失败则从会话目录重建"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = ScoreIndex()
+            if not index.load():
+                index.rebuild()
+            _index = index
+    return _index
+
+
+def index_report(session, report_id, report, tags=()):
+    """报告写入后更新得分索引，索引出错不影响报告本身"""
+    try:
+        get_score_index().add(
+            session["session_id"], report_id, report["scores_by_turn"], tags=tags,
+            evaluation=report["summary"].get("overall_evaluation", ""),
+        )
+    except Exception as e:
+        print(f"更新得分索引失败: {e}")
+
+
+def save_score_index():
+    if _index is not None:
+        _index.save()
@@ -0,0 +1,259 @@
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+
+# 会话存储后端："memory" 单进程使用，"sqlite" 多个worker共享同一个数据库文件
+backend = "memory"
+sqlite_path = "./data/sessions.db"
+# 未上传简历的会话超过该时间（秒）视为过期，由reaper清理
+session_ttl = 30 * 60
+# sqlite后端等待消息时的轮询间隔（秒），没有消息时逐次翻倍，最长max_poll_interval
+poll_interval = 0.1
+max_poll_interval = 0.5
+
+# 会话中可以在进程间共享的字段，channel、事件等运行时对象只保存在创建会话的进程里
+SHARED_FIELDS = (
+    "session_id", "candidate_name", "resume_path", "save_path",
+    "state_count", "current_state", "parse_job", "reports", "created_at", "updated_at",
+)
+
+
+class SessionStore:
+    """
+    会话存储接口。
+
+    除会话字段的读写外，还提供按会话投递的消息（如"resume_uploaded"、"answer"），
+    可以由任意进程投递，由运行该会话状态机的进程等待取出。
+    协程中使用a开头的版本，需要访问磁盘的实现会把调用放到线程中执行，不阻塞事件循环。
+    """
+
+    # 同步方法是否会阻塞，为True时异步版本在线程中执行
+    blocking = False
+
+    def create(self, session):
+        raise NotImplementedError
+
+    def get(self, session_id):
+        raise NotImplementedError
+
+    def update(self, session_id, **fields):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+    def expired(self, ttl=None):
+        """返回创建超过ttl秒仍未上传简历的会话ID"""
+        raise NotImplementedError
+
+    def put_message(self, session_id, kind, payload=None):
+        raise NotImplementedError
+
+    async def get_message(self, session_id, kind, timeout=None):
+        """等待并取出一条消息，超时抛出asyncio.TimeoutError"""
+        raise NotImplementedError
+
+    async def _call(self, func, *args, **kwargs):
+        if self.blocking:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
+
+    async def acreate(self, session):
+        return await self._call(self.create, session)
+
+    async def aget(self, session_id):
+        return await self._call(self.get, session_id)
+
+    async def aupdate(self, session_id, **fields):
+        return await self._call(self.update, session_id, **fields)
+
+    async def adelete(self, session_id):
+        return await self._call(self.delete, session_id)
+
+    async def aexpired(self, ttl=None):
+        return await self._call(self.expired, ttl)
+
+    async def aput_message(self, session_id, kind, payload=None):
+        return await self._call(self.put_message, session_id, kind, payload)
+
+    @staticmethod
+    def _shared(session):
+        record = {key: session.get(key) for key in SHARED_FIELDS}
+        now = time.time()
+        record["created_at"] = record["created_at"] or now
+        record["updated_at"] = now
+        return record
+
+
+class MemorySessionStore(SessionStore):
+    """单进程内存实现"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.queues = {}
+
+    def create(self, session):
+        self.sessions[session["session_id"]] = self._shared(session)
+
+    def get(self, session_id):
+        record = self.sessions.get(session_id)
+        return dict(record) if record else None
+
+    def update(self, session_id, **fields):
+        if session_id in self.sessions:
+            self.sessions[session_id].update(fields, updated_at=time.time())
+
+    def delete(self, session_id):
+        self.sessions.pop(session_id, None)
+        for key in [key for key in self.queues if key[0] == session_id]:
+            del self.queues[key]
+
+    def expired(self, ttl=None):
+        deadline = time.time() - (ttl or session_ttl)
+        return [
+            session_id for session_id, record in self.sessions.items()
+            if record["resume_path"] is None and record["created_at"] < deadline
+        ]
+
+    def _queue(self, session_id, kind):
+        return self.queues.setdefault((session_id, kind), asyncio.Queue())
+
+    def put_message(self, session_id, kind, payload=None):
+        self._queue(session_id, kind).put_nowait(payload)
+
+    async def get_message(self, session_id, kind, timeout=None):
+        return await asyncio.wait_for(self._queue(session_id, kind).get(), timeout)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SQLite实现，同一台机器上的多个uvicorn worker共享一个数据库文件。
+    消息写入messages表，等待方轮询取出，实现跨进程通知。
+    数据库调用可能等待其他进程的写锁，异步版本和消息轮询都在线程中执行。
+    """
+
+    blocking = True
+
+    def __init__(self, path=None):
+        self.path = path or sqlite_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                has_resume INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                payload TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, kind, id)")
+
+    def create(self, session):
+        record = self._shared(session)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, has_resume, created_at) VALUES (?, ?, ?, ?)",
+                (record["session_id"], json.dumps(record, ensure_ascii=False),
+                 int(record["resume_path"] is not None), record["created_at"])
+            )
+
+    def get(self, session_id):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, session_id, **fields):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                if row:
+                    record = json.loads(row[0])
+                    record.update(fields, updated_at=time.time())
+                    self.conn.execute(
+                        "UPDATE sessions SET data = ?, has_resume = ? WHERE session_id = ?",
+                        (json.dumps(record, ensure_ascii=False), int(record["resume_path"] is not None), session_id)
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, session_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self.conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def expired(self, ttl=None):
+        deadline = time.time() - (ttl or session_ttl)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT session_id FROM sessions WHERE has_resume = 0 AND created_at < ?", (deadline,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def put_message(self, session_id, kind, payload=None):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO messages (session_id, kind, payload) VALUES (?, ?, ?)",
+                (session_id, kind, json.dumps(payload, ensure_ascii=False))
+            )
+
+    def _pop_message(self, session_id, kind):
+        # 先用不加写锁的查询确认有消息，空轮询不和其他进程争抢写锁
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM messages WHERE session_id = ? AND kind = ? LIMIT 1", (session_id, kind)
+            ).fetchone()
+        if row is None:
+            return None
+
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT id, payload FROM messages WHERE session_id = ? AND kind = ? ORDER BY id LIMIT 1",
+                    (session_id, kind)
+                ).fetchone()
+                if row:
+                    self.conn.execute("DELETE FROM messages WHERE id = ?", (row[0],))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return row
+
+    async def get_message(self, session_id, kind, timeout=None):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        interval = poll_interval
+        while True:
+            row = await asyncio.to_thread(self._pop_message, session_id, kind)
+            if row:
+                return json.loads(row[1])
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(interval if deadline is None else min(interval, deadline - now))
+            interval = min(interval * 2, max_poll_interval)
+
+
+_store = None
+
+
+def get_store():
+    """获取按backend配置创建的会话存储"""
+    global _store
+    if _store is None:
+        _store = SqliteSessionStore() if backend == "sqlite" else MemorySessionStore()
+    return _store
@@ -0,0 +1,137 @@
+import asyncio
+
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.exceptions import OutputParserException
+
+from src.common.utils import side_llm_request, aside_llm_request
+
+# 单轮评分输出无法解析时的重试次数
+score_max_retries = 1
+# 同一场面试同时进行的评分请求数
+score_concurrency = 2
+
+# 附加在评分标准后面，约束单轮评分的输出格式
+SCORE_FORMAT = """
+请严格按照以下JSON格式输出结果，不要包含任何额外文字或解释：
+{"score": 8, "reason": "简要说明打分理由。"}
+"""
+
+
+def turn_pairs(conversations, answer_follows=False):
+    """
+    从对话记录中取出需要评分的(turn_id, 问题, 回答)
+
+    Args:
+        conversations: 对话记录中的conversations
+        answer_follows: 理论面试每轮记录的是(问题, 回答)；项目面试每轮记录的是(下一个问题, 回答)，
+            回答对应的是上一轮的问题，此时设为True，开场轮不计分
+    """
+    if not answer_follows:
+        return [(conv["turn_id"], conv["user"], conv["agent"]) for conv in conversations]
+
+    return [
+        (conv["turn_id"], prev["user"], conv["agent"])
+        for prev, conv in zip(conversations, conversations[1:])
+    ]
+
+
+def _format_turn(question, answer):
+    return f"问题：{question}\n回答：{answer}"
+
+
+def _parse_score(text, turn_id):
+    result = JsonOutputParser().parse(text)
+    try:
+        score = min(max(int(result["score"]), 0), 10)
+    except (KeyError, TypeError, ValueError) as e:
+        raise OutputParserException(f"评分结果缺少有效的score: {e}")
+    return {"turn_id": turn_id, "score": score, "reason": str(result.get("reason", ""))}
+
+
+def score_turn(rubric, turn_id, question, answer):
+    """
+    同步对单轮问答评分，用于报告生成时补齐在线评分失败的轮次
+
+    Returns:
+        dict: {"turn_id", "score", "reason"}，多次解析失败时返回None
+    """
+    for attempt in range(score_max_retries + 1):
+        try:
+            return _parse_score(side_llm_request(rubric + SCORE_FORMAT, _format_turn(question, answer), call_site="turn_score"), turn_id)
+        except OutputParserException as e:
+            print(f"第{turn_id}轮评分无法解析: {e}")
+    return None
+
+
+async def ascore_turn(rubric, turn_id, question, answer):
+    """score_turn的异步版本"""
+    for attempt in range(score_max_retries + 1):
+        try:
+            text = await aside_llm_request(rubric + SCORE_FORMAT, _format_turn(question, answer), call_site="turn_score")
+            return _parse_score(text, turn_id)
+        except OutputParserException as e:
+            print(f"第{turn_id}轮评分无法解析: {e}")
+    return None
+
+
+def fill_scores(rubric, pairs, scores_by_turn=None):
+    """
+    补齐缺少评分的轮次，返回按turn_id排序的scores_by_turn
+
+    Args:
+        rubric: 评分标准
+        pairs: turn_pairs返回的(turn_id, 问题, 回答)
+        scores_by_turn: 在线评分已经得到的结果
+    """
+    scores = {score["turn_id"]: score for score in scores_by_turn or []}
+    for turn_id, question, answer in pairs:
+        if turn_id not in scores:
+            try:
+                score = score_turn(rubric, turn_id, question, answer)
+            except Exception as e:
+                print(f"第{turn_id}轮评分失败: {e}")
+                score = None
+            if score:
+                scores[turn_id] = score
+    return [scores[turn_id] for turn_id in sorted(scores)]
+
+
+def format_scores(scores_by_turn):
+    """把逐轮评分整理成生成总结用的文本"""
+    lines = [f"第 {score['turn_id']} 轮：{score['score']}分，{score['reason']}" for score in scores_by_turn]
+    if scores_by_turn:
+        average = sum(score["score"] for score in scores_by_turn) / len(scores_by_turn)
+        lines.append(f"平均分：{average:.1f}")
+    return "\n".join(lines)
+
+
+class TurnScorer:
+    """
+    面试进行中逐轮评分。
+
+    每轮问答记录后立即提交评分任务，与下一个问题的生成和候选人作答并行进行，
+    面试结束时只需等待最后几轮的评分，报告阶段只剩一次生成总结的调用。
+    单轮评分失败只影响这一轮，报告生成时会补评。
+    """
+
+    def __init__(self, rubric, concurrency=None):
+        self.rubric = rubric
+        self.semaphore = asyncio.Semaphore(concurrency or score_concurrency)
+        self.tasks = {}
+
+    def submit(self, turn_id, question, answer):
+        """提交一轮问答的评分，立即返回"""
+        self.tasks[turn_id] = asyncio.create_task(self._score(turn_id, question, answer))
+
+    async def _score(self, turn_id, question, answer):
+        async with self.semaphore:
+            try:
+                return await ascore_turn(self.rubric, turn_id, question, answer)
+            except Exception as e:
+                print(f"第{turn_id}轮评分失败: {e}")
+                return None
+
+    async def results(self):
+        """等待已提交的评分全部完成，按turn_id返回scores_by_turn，失败的轮次不包含在内"""
+        scores = await asyncio.gather(*self.tasks.values())
+        return sorted((score for score in scores if score), key=lambda score: score["turn_id"])
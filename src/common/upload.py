@@ -0,0 +1,86 @@
+import os
+import hashlib
+import tempfile
+
+# 上传文件分块大小与大小上限
+upload_chunk_size = 64 * 1024
+max_upload_bytes = 10 * 1024 * 1024
+# multipart表单中除文件以外的开销，用于根据Content-Length提前拒绝
+multipart_overhead = 64 * 1024
+
+PDF_MAGIC = b"%PDF-"
+
+
+class UploadRejected(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def check_content_length(content_length, max_bytes=None):
+    """
+    根据请求头的Content-Length提前拒绝过大的上传，此时请求体还没有被读取。
+
+    表单解析会先把整个multipart请求体缓存到临时文件，save_upload中的大小检查发生在请求体接收完之后，
+    所以这里是唯一能在接收前拦下过大上传的地方：没有Content-Length的请求（分块传输）无法预先判断大小，直接拒绝；
+    请求体长度与Content-Length不一致时由服务器断开连接。
+    """
+    max_bytes = max_bytes or max_upload_bytes
+    if content_length is None:
+        raise UploadRejected("上传请求缺少Content-Length", 411)
+    try:
+        length = int(content_length)
+    except ValueError:
+        raise UploadRejected("Content-Length无效", 400)
+    if length > max_bytes + multipart_overhead:
+        raise UploadRejected(f"文件过大，最大支持{max_bytes // (1024 * 1024)}MB", 413)
+
+
+async def save_upload(file, max_bytes=None, chunk_size=None, suffix='.pdf'):
+    """
+    把上传文件按块复制到独立的临时文件，同时校验PDF文件头、限制大小并计算SHA-256，
+    整个文件不会一次性读入内存，也不需要写完后再读一遍计算哈希。
+
+    调用时表单解析已经把整个请求体接收并缓存到Starlette的临时文件中，这里的大小检查只是兜底，
+    过大的上传需要由check_content_length在接收请求体之前拒绝。
+
+    Args:
+        file: FastAPI的UploadFile
+        max_bytes: 文件大小上限
+        chunk_size: 每次读取的字节数
+
+    Returns:
+        (tmp_path, sha256, size): 临时文件路径、内容哈希、文件大小
+    """
+    max_bytes = max_bytes or max_upload_bytes
+    chunk_size = chunk_size or upload_chunk_size
+
+    sha = hashlib.sha256()
+    size = 0
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+    try:
+        with tmp:
+            first = True
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                # PDF规范允许文件头出现在前1024字节内
+                if first and PDF_MAGIC not in chunk[:1024]:
+                    raise UploadRejected("文件内容不是PDF", 400)
+                first = False
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(f"文件过大，最大支持{max_bytes // (1024 * 1024)}MB", 413)
+
+                sha.update(chunk)
+                tmp.write(chunk)
+
+        if size == 0:
+            raise UploadRejected("文件为空", 400)
+    except Exception:
+        os.unlink(tmp.name)
+        raise
+
+    return tmp.name, sha.hexdigest(), size
@@ -4,41 +4,168 @@ import os
 import yaml
 import json
 import re
+import time
+
+from typing import List, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pdfminer.pdftypes import resolve1
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.messages import HumanMessage
-from langchain_community.llms import Tongyi
+from src.llm.router import get_routed_llm
 from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 
 from config.api_config import DASHSCOPE_API_KEY
+from src.common.writer import get_writer
+from src.common.llm_cache import get_llm_cache, cache_key
+
+# 页数少于该值时并行提取的进程开销得不偿失，直接顺序提取
+min_parallel_pages = 4
+
+
+# 检查Form XObject嵌套资源的最大深度，超过时按有文字层处理
+max_xobject_depth = 8
+
+
+def _resources_have_font(resources, depth=0, seen=None) -> bool:
+    """
+    递归检查资源字典及其中Form XObject的资源里有没有字体，无法确定时返回True
+    """
+    if depth > max_xobject_depth:
+        return True
+    seen = set() if seen is None else seen
+
+    resources = resolve1(resources) or {}
+    if not isinstance(resources, dict):
+        return True
+    if resolve1(resources.get('Font')):
+        return True
+
+    xobjects = resolve1(resources.get('XObject')) or {}
+    if not isinstance(xobjects, dict):
+        return True
+    for ref in xobjects.values():
+        # 同一个XObject可能被多处引用，按对象编号去重，避免循环引用
+        objid = getattr(ref, 'objid', None)
+        if objid is not None:
+            if objid in seen:
+                continue
+            seen.add(objid)
+
+        xobject = resolve1(ref)
+        attrs = getattr(xobject, 'attrs', None)
+        if attrs is None:
+            return True
+        subtype = resolve1(attrs.get('Subtype'))
+        if getattr(subtype, 'name', subtype) == 'Image':
+            continue
+        # Form XObject没有自己的Resources时沿用页面资源，页面资源里已经确认没有字体
+        if 'Resources' in attrs and _resources_have_font(attrs['Resources'], depth + 1, seen):
+            return True
+        if 'Resources' not in attrs and getattr(subtype, 'name', subtype) != 'Form':
+            return True
+    return False
+
+
+def _has_text_layer(page) -> bool:
+    """
+    只看页面资源（包括Form XObject中的资源）里有没有字体，不解析内容流，
+    确定只有图片的扫描页可以直接跳过，无法确定时按有文字层处理
+    """
+    try:
+        return _resources_have_font(page.page_obj.resources)
+    except Exception:
+        return True
+
 
-def read_pdf(pdf_path: str) -> str:
+def extract_pages(pdf_path: str, start: int, stop: int, deadline: float = None) -> List[Tuple[int, str]]:
+    """
+    提取[start, stop)范围内页面的文本，供并行提取的工作进程调用
+
+    Returns:
+        [(页码, 文本)]，跳过没有文字层和没有文本的页面
+    """
+    result = []
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, stop + 1))) as pdf:
+        for index, page in zip(range(start, stop), pdf.pages):
+            if deadline is not None and time.time() > deadline:
+                break
+            if not _has_text_layer(page):
+                continue
+            text = page.extract_text()
+            if text:
+                result.append((index, text))
+    return result
+
+
+def read_pdf(pdf_path: str, parallel: bool = False, workers: int = None, time_budget: float = None,
+             executor: Executor = None) -> str:
     """
     从指定的 PDF 文件路径中提取所有文本。
 
     Args:
         pdf_path: PDF 文件的路径。
+        parallel: 是否按页拆分到多个进程并行提取。
+        workers: 并行提取时拆分的份数，默认为CPU核数。
+        time_budget: 单个文档的时间预算（秒），超时返回已提取的部分文本。
+        executor: 并行提取使用的进程池，不传时临时创建。
 
     Returns:
         提取出的所有文本内容。
+
+    Raises:
+        BrokenProcessPool: 传入的进程池中有工作进程异常退出，调用方需要重建进程池。
     """
-    data = []
+    deadline = time.time() + time_budget if time_budget else None
 
     try:
         with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    data.append(text)
-        return "\n".join(data)
+            page_count = len(pdf.pages)
+
+        if not parallel or page_count < min_parallel_pages:
+            pages = extract_pages(pdf_path, 0, page_count, deadline)
+        else:
+            pages = _read_pdf_parallel(pdf_path, page_count, workers or os.cpu_count() or 1, deadline, executor)
+
+        if deadline is not None and time.time() > deadline:
+            print(f"{pdf_path} 提取超出时间预算，返回已提取的{len(pages)}/{page_count}页文本")
+        return "\n".join(text for _, text in sorted(pages))
+    except BrokenProcessPool:
+        raise
     except Exception as e:
         return f"处理 PDF 时发生错误：{e}"
 
 
+def _read_pdf_parallel(pdf_path, page_count, workers, deadline, executor=None):
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        step = -(-page_count // workers)
+        futures = [
+            executor.submit(extract_pages, pdf_path, start, min(start + step, page_count), deadline)
+            for start in range(0, page_count, step)
+        ]
+        timeout = max(deadline - time.time(), 0) if deadline else None
+        done, not_done = wait(futures, timeout=timeout)
+        for future in not_done:
+            future.cancel()
+
+        pages = []
+        for future in done:
+            pages.extend(future.result())
+        return pages
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
 def read_json(json_path: str) -> dict:
-    with open(json_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    # 经过后台写线程读取，能读到尚未落盘的最新内容
+    return get_writer().read_json(json_path)
 
 
 def read_prompt(prompt_path):
@@ -78,26 +205,48 @@ def read_prompt(prompt_path):
         return None
 
 
-def parse_pdf(resume_path, prompt_path="./data/prompt/parse_pdf.yaml"):    
+def _resume_chain(pdf_text):
     pdf_template = """
     {system_prompt}
 
     简历内容：
     {pdf_text}
     """
-    
-    system_prompt = read_prompt(prompt_path)
-    pdf_text = read_pdf(resume_path)
 
-    pdf_model = Tongyi(api_key=DASHSCOPE_API_KEY, model_name="qwen-turbo", temperature=0.3)
+    pdf_model, _ = get_routed_llm("resume", 0.3, prompt=pdf_text)
     pdf_parser = JsonOutputParser()
 
     pdf_prompt = ChatPromptTemplate.from_template(pdf_template)
-    pdf_chain = pdf_prompt | pdf_model | pdf_parser
-    
-    result = pdf_chain.invoke({"system_prompt": system_prompt, "pdf_text": pdf_text})
-    
-    return result
+    return pdf_prompt | pdf_model | pdf_parser
+
+
+def structure_resume(pdf_text, prompt_path="./data/prompt/parse_pdf.yaml"):
+    """
+    调用LLM把简历文本整理成结构化JSON
+    """
+    system_prompt = read_prompt(prompt_path)
+    return _resume_chain(pdf_text).invoke({"system_prompt": system_prompt, "pdf_text": pdf_text})
+
+
+async def astructure_resume(pdf_text, prompt_path="./data/prompt/parse_pdf.yaml"):
+    """
+    structure_resume的异步版本
+    """
+    system_prompt = read_prompt(prompt_path)
+    return await _resume_chain(pdf_text).ainvoke({"system_prompt": system_prompt, "pdf_text": pdf_text})
+
+
+def parse_pdf(resume_path, prompt_path="./data/prompt/parse_pdf.yaml"):    
+    pdf_text = read_pdf(resume_path)
+    return structure_resume(pdf_text, prompt_path)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地粗略估算token数：中日韩字符按每字1个token，其余按每4个字符1个token
+    """
+    cjk = len(re.findall(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]', text))
+    return cjk + (len(text) - cjk + 3) // 4
 
 
 def clean_str(str: str) -> str:
@@ -105,25 +254,70 @@ def clean_str(str: str) -> str:
 
 
 def update_test_status(resume_path, section, name):
-    with open(resume_path, 'r', encoding='utf-8') as f:
-        resume = json.load(f)
+    writer = get_writer()
+    resume = writer.read_json(resume_path)
     
     resume[section][name]["已考核"] = True
     
-    with open(resume_path, 'w', encoding='utf-8') as f:
-        json.dump(resume, f, ensure_ascii=False, indent=4)
+    writer.write_json(resume_path, resume, indent=4)
     
     print(f"更新{section}的{name}的已考核状态为True\n")
 
 
-def side_llm_request(prompt, user_input):
-    llm = Tongyi(api_key=DASHSCOPE_API_KEY, model_name="qwen-turbo", temperature=0.3)
+def side_llm_request(prompt, user_input, use_cache=False, call_site="classify"):
+    """
+    Args:
+        use_cache: 分类类调用（如解析编程语言）设为True，相同提示词和归一化后相同的输入直接返回缓存结果
+        call_site: 调用点，决定模型路由策略，见src/llm/router.py
+    """
+    if use_cache:
+        key = cache_key(prompt, user_input)
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            return cached
 
     formatted_prompt = prompt
     message = HumanMessage(content=f"{formatted_prompt}\n\n用户输入：{user_input}")
+    llm, _ = get_routed_llm(call_site, 0.3, prompt=message.content)
     
     chain = llm | StrOutputParser()
-    return chain.invoke([message])
+    result = chain.invoke([message])
+
+    if use_cache:
+        get_llm_cache().put(key, result)
+    return result
+
+
+async def aside_llm_request(prompt, user_input, use_cache=False, call_site="classify"):
+    """
+    side_llm_request的异步版本
+    """
+    if use_cache:
+        key = cache_key(prompt, user_input)
+        cached = get_llm_cache().get(key)
+        if cached is not None:
+            return cached
+
+    message = HumanMessage(content=f"{prompt}\n\n用户输入：{user_input}")
+    llm, _ = get_routed_llm(call_site, 0.3, prompt=message.content)
+
+    chain = llm | StrOutputParser()
+    result = await chain.ainvoke([message])
+
+    if use_cache:
+        get_llm_cache().put(key, result)
+    return result
+
+
+def astream_side_llm_request(prompt, user_input, call_site="follow_up"):
+    """
+    side_llm_request的流式版本，返回逐段生成文本的异步迭代器
+    """
+    message = HumanMessage(content=f"{prompt}\n\n用户输入：{user_input}")
+    llm, _ = get_routed_llm(call_site, 0.3, prompt=message.content)
+
+    chain = llm | StrOutputParser()
+    return chain.astream([message])
 
 
 def generate_question_tags(language, position):
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import asyncio
+import threading
+
+# 后台写线程每批之间的等待时间（秒），窗口内对同一文件的多次写入只落盘最后一次
+flush_interval = 0.05
+
+
+class BackgroundWriter:
+    """
+    后台写线程，把对话记录、简历状态和报告等JSON文件的写入移出面试流程。
+
+    同一路径的待写内容只保留最新一份，按批写入，每个文件都先写临时文件再rename，
+    读文件时优先返回尚未落盘的内容，保证调用方读到自己刚写的数据。
+    追加写入（如对话记录的journal）按提交顺序保留每一行，同一批内先于整文件写入执行，
+    需要fsync时每批每个文件只fsync一次。
+    """
+
+    def __init__(self, interval=None):
+        self.interval = flush_interval if interval is None else interval
+        self.pending = {}
+        self.inflight = {}
+        self.appends = {}
+        self.appending = set()
+        self.callbacks = {}
+        self.submitted = 0
+        self.completed = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="background-writer", daemon=True)
+        self.thread.start()
+
+    def write_json(self, path, data, indent=4, callback=None, fsync=False):
+        """
+        提交一次JSON写入，data在调用时就序列化，之后修改data不影响写入内容
+
+        Args:
+            path: 目标文件路径
+            data: 要写入的对象
+            indent: json缩进
+            callback: 写入完成后在后台线程中调用
+            fsync: rename前是否fsync临时文件
+        """
+        content = json.dumps(data, ensure_ascii=False, indent=indent)
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError("BackgroundWriter已关闭")
+            self.pending[path] = (content, fsync)
+            if callback:
+                self.callbacks.setdefault(path, []).append(callback)
+            self.submitted += 1
+            self.condition.notify_all()
+
+    def append_line(self, path, line, fsync=False):
+        """
+        提交一行追加写入，同一路径的行按提交顺序写入
+
+        Args:
+            path: 目标文件路径
+            line: 要追加的一行文本，不含换行符
+            fsync: 写入后是否fsync，同一批中任意一行要求时整批fsync
+        """
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError("BackgroundWriter已关闭")
+            lines, need_fsync = self.appends.get(path, ([], False))
+            lines.append(line + "\n")
+            self.appends[path] = (lines, need_fsync or fsync)
+            self.submitted += 1
+            self.condition.notify_all()
+
+    def has_appends(self, path):
+        """path是否还有尚未落盘的追加写入"""
+        with self.condition:
+            return path in self.appends or path in self.appending
+
+    def read_json(self, path, object_pairs_hook=None):
+        """读取JSON文件，优先返回还在队列中的内容，文件不存在时返回None"""
+        with self.condition:
+            entry = self.pending.get(path, self.inflight.get(path))
+        if entry is not None:
+            return json.loads(entry[0], object_pairs_hook=object_pairs_hook)
+
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f, object_pairs_hook=object_pairs_hook)
+
+    def exists(self, path):
+        with self.condition:
+            if path in self.pending or path in self.inflight or path in self.appends or path in self.appending:
+                return True
+        return os.path.exists(path)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.appends and not self.stopped:
+                    self.condition.wait()
+                if not self.pending and not self.appends and self.stopped:
+                    return
+
+            # 稍等片刻，让紧接着的写入合并进同一批
+            if self.interval:
+                time.sleep(self.interval)
+
+            with self.condition:
+                batch, self.pending = self.pending, {}
+                appends, self.appends = self.appends, {}
+                callbacks, self.callbacks = self.callbacks, {}
+                self.inflight = batch
+                self.appending = set(appends)
+                target = self.submitted
+
+            # 先追加再整文件写入，整文件写入的回调（如删除journal）不会早于之前提交的追加
+            for path, (lines, fsync) in appends.items():
+                try:
+                    self._append(path, lines, fsync)
+                except Exception as e:
+                    print(f"追加写入文件 {path} 失败: {e}")
+
+            for path, (content, fsync) in batch.items():
+                try:
+                    self._write_atomic(path, content, fsync)
+                    for callback in callbacks.get(path, []):
+                        callback()
+                except Exception as e:
+                    print(f"写入文件 {path} 失败: {e}")
+
+            with self.condition:
+                self.inflight = {}
+                self.appending = set()
+                self.completed = target
+                self.condition.notify_all()
+
+    @staticmethod
+    def _append(path, lines, fsync=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("".join(lines))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def _write_atomic(path, content, fsync=False):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def flush(self, timeout=None):
+        """等待调用之前提交的所有写入落盘"""
+        with self.condition:
+            target = self.submitted
+            return self.condition.wait_for(lambda: self.completed >= target, timeout=timeout)
+
+    async def aflush(self, timeout=None):
+        """flush的异步版本，状态转移前await，不阻塞事件循环"""
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def shutdown(self):
+        """写完队列中剩余的内容后停止后台线程"""
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """获取进程内共享的后台写线程"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BackgroundWriter()
+    return _writer
+
+
+def shutdown_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.shutdown()
+            _writer = None
@@ -1,7 +1,11 @@
 import json
+import time
+import hashlib
+import threading
 
 from pathlib import Path
-from neo4j import GraphDatabase
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from neo4j import GraphDatabase, AsyncGraphDatabase
 
 from config.api_config import NEO4J_PASSWORD
 
@@ -9,6 +13,184 @@ uri = "bolt://localhost:7687"
 username = "neo4j"
 password = NEO4J_PASSWORD
 
+# 连接池配置，整个进程共用一个driver
+pool_config = {
+    "max_connection_pool_size": 100,
+    "connection_acquisition_timeout": 30,
+    "max_connection_lifetime": 3600,
+}
+
+# 题库后端："neo4j" 或 "memory"
+backend = "neo4j"
+# memory后端从这些JSON文件加载，为空时从Neo4j一次性读取
+question_bank_files = []
+
+# 相关问题是否优先读取预计算的RELATED_TO关系，以及每个问题保留的相关问题数
+use_related_table = True
+related_top_n = 20
+# 清空图谱时每个事务删除的节点数，避免一次删除整个图谱占满事务内存
+clear_batch_size = 10000
+
+_driver = None
+_async_driver = None
+_driver_lock = threading.Lock()
+_question_bank = None
+
+QUESTION_QUERY = """
+MATCH (q:Question)-[:HAS_TAG]->(t:Tag {name: $tag})
+WHERE NOT q.id IN $asked_questions
+RETURN q.id as id, q.text as question
+ORDER BY rand()
+LIMIT 1
+"""
+
+RELATED_QUESTION_QUERY = """
+MATCH (current:Question {id: $current_id})-[:HAS_TAG]->(tag:Tag)
+MATCH (related:Question)-[:HAS_TAG]->(tag)
+WHERE related.id <> $current_id 
+  AND NOT related.id IN $asked_questions
+WITH related, count(tag) as common_tags
+ORDER BY common_tags DESC
+LIMIT $top_k
+RETURN related.id as id, related.text as question
+ORDER BY rand()
+LIMIT 1
+"""
+
+RELATED_TABLE_QUERY = """
+MATCH (current:Question {id: $current_id})-[r:RELATED_TO]->(related:Question)
+WHERE NOT related.id IN $asked_questions
+WITH related, r
+ORDER BY r.rank
+LIMIT $top_k
+RETURN related.id as id, related.text as question
+ORDER BY rand()
+LIMIT 1
+"""
+
+
+def get_driver():
+    """
+    获取进程内共享的Neo4j driver，首次调用时创建
+    """
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = GraphDatabase.driver(uri, auth=(username, password), **pool_config)
+    return _driver
+
+
+def get_async_driver():
+    """
+    获取进程内共享的异步Neo4j driver，需要在事件循环中调用
+    """
+    global _async_driver
+    if _async_driver is None:
+        _async_driver = AsyncGraphDatabase.driver(uri, auth=(username, password), **pool_config)
+    return _async_driver
+
+
+def init_driver(**kwargs):
+    """
+    启动时创建driver并预热连接
+
+    Args:
+        **kwargs: 覆盖默认的连接池配置，如max_connection_pool_size
+    """
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+        pool_config.update(kwargs)
+        _driver = GraphDatabase.driver(uri, auth=(username, password), **pool_config)
+
+    try:
+        _driver.verify_connectivity()
+        with _driver.session() as session:
+            session.run("RETURN 1").consume()
+        print("Neo4j连接预热完成")
+    except Exception as e:
+        print(f"Neo4j连接预热失败: {e}")
+
+
+async def init_async_driver():
+    """
+    启动时创建异步driver并预热连接
+    """
+    driver = get_async_driver()
+    try:
+        await driver.verify_connectivity()
+    except Exception as e:
+        print(f"Neo4j异步连接预热失败: {e}")
+
+
+def close_driver():
+    """
+    关闭共享的同步driver，在进程退出时调用
+    """
+    global _driver
+    with _driver_lock:
+        if _driver is not None:
+            _driver.close()
+            _driver = None
+
+
+async def close_async_driver():
+    """
+    关闭共享的异步driver，在进程退出时调用
+    """
+    global _async_driver
+    if _async_driver is not None:
+        await _async_driver.close()
+        _async_driver = None
+
+
+def set_question_bank(bank):
+    """
+    设置内存题库，设置后get_question/get_related_question不再访问Neo4j
+
+    Args:
+        bank: MemoryQuestionBank实例，传None则切回Neo4j
+    """
+    global _question_bank
+    _question_bank = bank
+
+
+def init_question_bank():
+    """
+    按backend配置初始化题库，memory后端会一次性加载整个题库
+    """
+    if backend != "memory":
+        return None
+
+    from src.graph.memory_bank import MemoryQuestionBank
+
+    if question_bank_files:
+        bank = MemoryQuestionBank.from_files(question_bank_files)
+    else:
+        bank = MemoryQuestionBank.from_neo4j(get_driver())
+    set_question_bank(bank)
+    print(f"内存题库加载完成，共{len(bank.questions)}个问题")
+    return bank
+
+
+def _to_question(record):
+    if record:
+        return {
+            "id": record["id"],
+            "question": record["question"]
+        }
+    return None
+
+def fingerprint(unique_id, item):
+    """
+    计算问题的指纹，id、题干、答案、标签任一变化都会改变指纹
+    """
+    content = json.dumps([unique_id, item['question'], item['answer'], sorted(item['tags'])], ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
 def import_data(tx, data, file_name):
     for item in data:
         unique_id = f"{file_name}_{item['id']}"
@@ -17,11 +199,12 @@ def import_data(tx, data, file_name):
         tx.run(
             """
             MERGE (q:Question {id: $unique_id})
-            SET q.text = $question_text
+            SET q.text = $question_text, q.fingerprint = $fingerprint
             MERGE (a:Answer {text: $answer_text})
             MERGE (q)-[:HAS_ANSWER]->(a)
             """,
-            unique_id=unique_id, question_text=item['question'], answer_text=item['answer']
+            unique_id=unique_id, question_text=item['question'], answer_text=item['answer'],
+            fingerprint=fingerprint(unique_id, item)
         )
 
         # 为每个标签创建节点并建立关系
@@ -49,39 +232,22 @@ def get_question(tag, asked_questions=None):
     """
     if asked_questions is None:
         asked_questions = set()
+
+    if _question_bank is not None:
+        return _question_bank.get_question(tag, asked_questions)
     
     try:
-        driver = GraphDatabase.driver(uri, auth=(username, password))
-        with driver.session() as session:
+        with get_driver().session() as session:
             # 查询有指定tag的问题，随机返回一个
-            query = """
-            MATCH (q:Question)-[:HAS_TAG]->(t:Tag {name: $tag})
-            WHERE NOT q.id IN $asked_questions
-            RETURN q.id as id, q.text as question
-            ORDER BY rand()
-            LIMIT 1
-            """
-            
-            result = session.run(query, {
+            result = session.run(QUESTION_QUERY, {
                 "tag": tag,
                 "asked_questions": list(asked_questions)
             })
-            record = result.single()
-            
-            if record:
-                return {
-                    "id": record["id"],
-                    "question": record["question"]
-                }
-            else:
-                return None
+            return _to_question(result.single())
                 
     except Exception as e:
         print(f"获取随机问题失败: {e}")
         return None
-    finally:
-        if 'driver' in locals():
-            driver.close()
 
 
 def get_related_question(current_question_id, asked_questions=None, top_k=5):
@@ -98,45 +264,84 @@ def get_related_question(current_question_id, asked_questions=None, top_k=5):
     """
     if asked_questions is None:
         asked_questions = set()
+
+    if _question_bank is not None:
+        return _question_bank.get_related_question(current_question_id, asked_questions, top_k)
     
     try:
-        driver = GraphDatabase.driver(uri, auth=(username, password))
-        with driver.session() as session:
-            # 基于共同标签找相关问题，按相关度排序取top_k，然后随机选择
-            query = """
-            MATCH (current:Question {id: $current_id})-[:HAS_TAG]->(tag:Tag)
-            MATCH (related:Question)-[:HAS_TAG]->(tag)
-            WHERE related.id <> $current_id 
-              AND NOT related.id IN $asked_questions
-            WITH related, count(tag) as common_tags
-            ORDER BY common_tags DESC
-            LIMIT $top_k
-            RETURN related.id as id, related.text as question
-            ORDER BY rand()
-            LIMIT 1
-            """
-            
-            result = session.run(query, {
+        with get_driver().session() as session:
+            params = {
                 "current_id": current_question_id,
                 "asked_questions": list(asked_questions),
                 "top_k": top_k
-            })
-            
-            record = result.single()
-            if record:
-                return {
-                    "id": record["id"],
-                    "question": record["question"]
-                }
-            else:
-                return None
+            }
+            # 优先读预计算的相关问题表，表中候选都已问过时再实时计算
+            if use_related_table:
+                record = session.run(RELATED_TABLE_QUERY, params).single()
+                if record:
+                    return _to_question(record)
+
+            # 基于共同标签找相关问题，按相关度排序取top_k，然后随机选择
+            result = session.run(RELATED_QUESTION_QUERY, params)
+            return _to_question(result.single())
                 
     except Exception as e:
         print(f"获取相关问题失败: {e}")
         return None
-    finally:
-        if 'driver' in locals():
-            driver.close()
+
+
+async def get_question_async(tag, asked_questions=None):
+    """
+    get_question的异步版本，不阻塞事件循环
+    """
+    if asked_questions is None:
+        asked_questions = set()
+
+    if _question_bank is not None:
+        return _question_bank.get_question(tag, asked_questions)
+
+    try:
+        async with get_async_driver().session() as session:
+            result = await session.run(QUESTION_QUERY, {
+                "tag": tag,
+                "asked_questions": list(asked_questions)
+            })
+            return _to_question(await result.single())
+
+    except Exception as e:
+        print(f"获取随机问题失败: {e}")
+        return None
+
+
+async def get_related_question_async(current_question_id, asked_questions=None, top_k=5):
+    """
+    get_related_question的异步版本，不阻塞事件循环
+    """
+    if asked_questions is None:
+        asked_questions = set()
+
+    if _question_bank is not None:
+        return _question_bank.get_related_question(current_question_id, asked_questions, top_k)
+
+    try:
+        async with get_async_driver().session() as session:
+            params = {
+                "current_id": current_question_id,
+                "asked_questions": list(asked_questions),
+                "top_k": top_k
+            }
+            if use_related_table:
+                result = await session.run(RELATED_TABLE_QUERY, params)
+                record = await result.single()
+                if record:
+                    return _to_question(record)
+
+            result = await session.run(RELATED_QUESTION_QUERY, params)
+            return _to_question(await result.single())
+
+    except Exception as e:
+        print(f"获取相关问题失败: {e}")
+        return None
 
 
 def process_file(file_list):
@@ -156,4 +361,346 @@ def process_file(file_list):
                     print(f"导入文件 {file_path} 失败: {str(e)}")
     finally:
         if 'driver' in locals():
-            driver.close()
\ No newline at end of file
+            driver.close()
+
+
+def clear_graph(session, batch_size=None):
+    """分批删除图谱中的所有节点和关系，每批一个事务"""
+    session.run(
+        "MATCH (n) CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF $batch_size ROWS",
+        batch_size=batch_size or clear_batch_size
+    ).consume()
+
+
+def create_constraints(session):
+    """
+    批量导入前创建唯一约束和索引，使MERGE走索引而不是全表扫描
+    """
+    session.run("CREATE CONSTRAINT question_id IF NOT EXISTS FOR (q:Question) REQUIRE q.id IS UNIQUE").consume()
+    session.run("CREATE CONSTRAINT tag_name IF NOT EXISTS FOR (t:Tag) REQUIRE t.name IS UNIQUE").consume()
+    session.run("CREATE INDEX answer_text IF NOT EXISTS FOR (a:Answer) ON (a.text)").consume()
+
+
+def build_rows(data, file_name):
+    """
+    把JSON题目转换成UNWIND使用的参数列表
+
+    Returns:
+        (question_rows, tag_rows): 问题行和问题-标签关系行
+    """
+    question_rows, tag_rows = [], []
+    for item in data:
+        unique_id = f"{file_name}_{item['id']}"
+        question_rows.append({
+            "id": unique_id,
+            "question": item['question'],
+            "answer": item['answer'],
+            "fingerprint": fingerprint(unique_id, item),
+        })
+        for tag_name in item['tags']:
+            tag_rows.append({"id": unique_id, "tag": tag_name})
+    return question_rows, tag_rows
+
+
+def import_questions_batch(tx, rows):
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MERGE (q:Question {id: row.id})
+        SET q.text = row.question, q.fingerprint = row.fingerprint
+        WITH q, row
+        MATCH (a:Answer {text: row.answer})
+        MERGE (q)-[:HAS_ANSWER]->(a)
+        """,
+        rows=rows
+    ).consume()
+
+
+def import_tags_batch(tx, rows):
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (q:Question {id: row.id})
+        MATCH (t:Tag {name: row.tag})
+        MERGE (q)-[:HAS_TAG]->(t)
+        """,
+        rows=rows
+    ).consume()
+
+
+def import_tag_names(tx, names):
+    tx.run("UNWIND $names AS name MERGE (:Tag {name: name})", names=names).consume()
+
+
+def import_answers(tx, texts):
+    tx.run("UNWIND $texts AS text MERGE (:Answer {text: text})", texts=texts).consume()
+
+
+def _chunks(rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
+
+
+def import_file_bulk(file_path, batch_size=1000):
+    """
+    分批导入单个JSON文件，每批一个事务，标签和答案节点需要已由process_file_bulk统一创建
+
+    Returns:
+        int: 导入的行数（问题行 + 标签关系行）
+    """
+    file_name = Path(file_path).name.split('.')[0]
+    with open(file_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    question_rows, tag_rows = build_rows(data, file_name)
+    with get_driver().session() as session:
+        for chunk in _chunks(question_rows, batch_size):
+            session.execute_write(import_questions_batch, chunk)
+        for chunk in _chunks(tag_rows, batch_size):
+            session.execute_write(import_tags_batch, chunk)
+
+    return len(question_rows) + len(tag_rows)
+
+
+def process_file_bulk(file_list, batch_size=1000, workers=4, clear=True, rebuild_related=True):
+    """
+    批量导入模式：UNWIND参数列表分批写入，多个文件在独立session中并行导入
+
+    Args:
+        file_list: JSON文件路径列表
+        batch_size: 每个事务写入的行数
+        workers: 并行导入的文件数
+        clear: 导入前是否清空图谱
+        rebuild_related: 导入后是否更新相关问题表，清空导入时全部重建，
+            否则只重建导入的问题和与它们有共同标签的问题
+    """
+    start = time.perf_counter()
+    with get_driver().session() as session:
+        if clear:
+            clear_graph(session)
+        create_constraints(session)
+
+        # 标签和答案可能在文件间共享，先在一个session中统一创建：
+        # 避免并行MERGE同一个标签时互相等锁，也避免并行MERGE同一个答案时重复创建（answer_text只是普通索引）
+        tag_names = set()
+        answers = set()
+        imported_ids = set()
+        for file_path in file_list:
+            file_name = Path(file_path).name.split('.')[0]
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for item in json.load(f):
+                    tag_names.update(item['tags'])
+                    answers.add(item['answer'])
+                    imported_ids.add(f"{file_name}_{item['id']}")
+        for chunk in _chunks(sorted(tag_names), batch_size):
+            session.execute_write(import_tag_names, chunk)
+        for chunk in _chunks(sorted(answers), batch_size):
+            session.execute_write(import_answers, chunk)
+
+    total_rows = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(import_file_bulk, file_path, batch_size): file_path for file_path in file_list}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                rows = future.result()
+                total_rows += rows
+                print(f"{Path(file_path).name.split('.')[0]} 导入完成，共{rows}行")
+            except Exception as e:
+                print(f"导入文件 {file_path} 失败: {str(e)}")
+
+    elapsed = time.perf_counter() - start
+    print(f"批量导入完成：{total_rows}行，耗时{elapsed:.2f}秒，{total_rows / max(elapsed, 1e-9):.0f}行/秒")
+
+    if rebuild_related:
+        if clear:
+            rebuild_related_table()
+        else:
+            rebuild_related_table(ids=imported_ids | questions_with_tags(tag_names))
+    return total_rows
+
+
+def upsert_questions_batch(tx, rows):
+    """
+    覆盖写入一批问题：先删掉旧的标签和答案关系，再按新内容重建，整批在一个事务内完成
+    """
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MERGE (q:Question {id: row.id})
+        WITH q, row
+        OPTIONAL MATCH (q)-[r:HAS_TAG|HAS_ANSWER]->()
+        DELETE r
+        WITH DISTINCT q, row
+        SET q.text = row.question, q.fingerprint = row.fingerprint
+        MERGE (a:Answer {text: row.answer})
+        MERGE (q)-[:HAS_ANSWER]->(a)
+        WITH q, row
+        UNWIND row.tags AS tag_name
+        MERGE (t:Tag {name: tag_name})
+        MERGE (q)-[:HAS_TAG]->(t)
+        """,
+        rows=rows
+    ).consume()
+
+
+def delete_questions_batch(tx, ids):
+    tx.run("UNWIND $ids AS id MATCH (q:Question {id: id}) DETACH DELETE q", ids=ids).consume()
+
+
+def delete_orphans(tx):
+    """删除没有问题引用的答案和标签节点"""
+    tx.run("MATCH (a:Answer) WHERE NOT (a)<-[:HAS_ANSWER]-() DELETE a").consume()
+    tx.run("MATCH (t:Tag) WHERE NOT (t)<-[:HAS_TAG]-() DELETE t").consume()
+
+
+def sync_files(file_list, batch_size=1000, rebuild_related=True):
+    """
+    增量同步题库：按指纹比较JSON文件与图谱，只写入新增和修改的问题，只删除已消失的问题。
+    整个过程不清空图谱，同步期间题库始终可用。
+
+    Args:
+        file_list: JSON文件路径列表，需要包含完整题库
+        batch_size: 每个事务写入的问题数
+        rebuild_related: 有变化时是否更新相关问题表，只重建受影响的问题：新增和修改的问题、
+            与它们的新旧标签有共同标签的问题、相关问题列表中引用了被删除问题的问题
+
+    Returns:
+        dict: 新增、修改、删除、未变化的问题数
+    """
+    start = time.perf_counter()
+
+    desired = {}
+    for file_path in file_list:
+        file_name = Path(file_path).name.split('.')[0]
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        question_rows, _ = build_rows(data, file_name)
+        for row, item in zip(question_rows, data):
+            row["tags"] = list(dict.fromkeys(item['tags']))
+            desired[row["id"]] = row
+
+    with get_driver().session() as session:
+        create_constraints(session)
+        existing = {
+            record["id"]: record["fingerprint"]
+            for record in session.run("MATCH (q:Question) RETURN q.id as id, q.fingerprint as fingerprint")
+        }
+
+        added = [row for qid, row in desired.items() if qid not in existing]
+        changed = [row for qid, row in desired.items() if qid in existing and existing[qid] != row["fingerprint"]]
+        removed = [qid for qid in existing if qid not in desired]
+
+        # 写入前记下修改前的标签和引用了被删除问题的问题，写入后就查不到了
+        affected_tags = set()
+        referencing = set()
+        if rebuild_related:
+            affected_tags = {
+                record["name"] for record in session.run(
+                    "UNWIND $ids AS id MATCH (:Question {id: id})-[:HAS_TAG]->(t:Tag) RETURN DISTINCT t.name AS name",
+                    ids=[row["id"] for row in changed]
+                )
+            }
+            referencing = {
+                record["id"] for record in session.run(
+                    "UNWIND $ids AS id MATCH (q:Question)-[:RELATED_TO]->(:Question {id: id}) RETURN DISTINCT q.id AS id",
+                    ids=removed
+                )
+            }
+
+        for chunk in _chunks(added + changed, batch_size):
+            session.execute_write(upsert_questions_batch, chunk)
+        for chunk in _chunks(removed, batch_size):
+            session.execute_write(delete_questions_batch, chunk)
+        if changed or removed:
+            session.execute_write(delete_orphans)
+
+    summary = {
+        "added": len(added),
+        "changed": len(changed),
+        "removed": len(removed),
+        "unchanged": len(desired) - len(added) - len(changed),
+    }
+    elapsed = time.perf_counter() - start
+    print(f"题库同步完成，耗时{elapsed:.2f}秒：新增{summary['added']}，修改{summary['changed']}，"
+          f"删除{summary['removed']}，未变化{summary['unchanged']}")
+    for row in added:
+        print(f"  + {row['id']}")
+    for row in changed:
+        print(f"  ~ {row['id']}")
+    for qid in removed:
+        print(f"  - {qid}")
+
+    if rebuild_related and (added or changed or removed):
+        upserted = added + changed
+        for row in upserted:
+            affected_tags.update(row["tags"])
+        affected = {row["id"] for row in upserted} | referencing | questions_with_tags(affected_tags)
+        rebuild_related_table(ids=affected - set(removed))
+    return summary
+
+
+def questions_with_tags(tag_names):
+    """带有任一给定标签的问题ID"""
+    if not tag_names:
+        return set()
+    with get_driver().session() as session:
+        return {
+            record["id"] for record in session.run(
+                "MATCH (q:Question)-[:HAS_TAG]->(t:Tag) WHERE t.name IN $names RETURN DISTINCT q.id AS id",
+                names=sorted(tag_names)
+            )
+        }
+
+
+def build_related_batch(tx, ids, top_n):
+    """
+    为一批问题重建RELATED_TO关系：按共同标签数降序保留前top_n个，rank从0开始
+    """
+    tx.run(
+        """
+        UNWIND $ids AS qid
+        MATCH (:Question {id: qid})-[old:RELATED_TO]->()
+        DELETE old
+        """,
+        ids=ids
+    ).consume()
+    tx.run(
+        """
+        UNWIND $ids AS qid
+        MATCH (current:Question {id: qid})-[:HAS_TAG]->(tag:Tag)<-[:HAS_TAG]-(related:Question)
+        WHERE related <> current
+        WITH current, related, count(tag) AS common_tags
+        ORDER BY common_tags DESC, rand()
+        WITH current, collect({question: related, common_tags: common_tags})[..$top_n] AS ranked
+        UNWIND range(0, size(ranked) - 1) AS i
+        WITH current, ranked[i] AS item, i
+        WITH current, item.question AS related, item.common_tags AS common_tags, i
+        CREATE (current)-[:RELATED_TO {common_tags: common_tags, rank: i}]->(related)
+        """,
+        ids=ids, top_n=top_n
+    ).consume()
+
+
+def rebuild_related_table(top_n=None, batch_size=500, ids=None):
+    """
+    预计算每个问题的前top_n个相关问题并存为RELATED_TO关系，
+    按批次替换，重建过程中get_related_question仍然可用
+
+    Args:
+        top_n: 每个问题保留的相关问题数，默认使用related_top_n
+        batch_size: 每个事务处理的问题数
+        ids: 只重建这些问题的相关问题，默认重建全部
+    """
+    top_n = top_n or related_top_n
+    start = time.perf_counter()
+    with get_driver().session() as session:
+        if ids is None:
+            ids = [record["id"] for record in session.run("MATCH (q:Question) RETURN q.id as id")]
+        else:
+            ids = sorted(ids)
+        for chunk in _chunks(ids, batch_size):
+            session.execute_write(build_related_batch, chunk, top_n)
+
+    elapsed = time.perf_counter() - start
+    print(f"相关问题表重建完成：{len(ids)}个问题，每个保留前{top_n}个，耗时{elapsed:.2f}秒")
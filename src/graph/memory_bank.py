@@ -0,0 +1,132 @@
+import json
+import random
+
+from pathlib import Path
+from collections import defaultdict
+
+
+class MemoryQuestionBank:
+    """
+    常驻内存的题库，作为Neo4j之外的可选后端。
+
+    加载时建立 tag -> 问题 的倒排索引，并预先计算每个问题按共同标签数排序的相关问题列表，
+    查询结果与graph.py中Cypher查询的语义保持一致。
+    """
+
+    def __init__(self):
+        self.questions = {}                 # id -> 问题文本
+        self.answers = {}                   # id -> 答案文本
+        self.tags = {}                      # id -> 标签元组
+        self.tag_index = defaultdict(list)  # tag -> [问题id]
+        self.neighbors = {}                 # id -> [(共同标签数, 问题id)]，按共同标签数降序
+
+    def add_question(self, question_id, text, answer=None, tags=()):
+        self.questions[question_id] = text
+        self.answers[question_id] = answer
+        self.tags[question_id] = tuple(dict.fromkeys(tags))
+        for tag in self.tags[question_id]:
+            self.tag_index[tag].append(question_id)
+
+    def build(self):
+        """根据倒排索引预计算每个问题的相关问题列表"""
+        self.neighbors = {}
+        for question_id, tags in self.tags.items():
+            common = defaultdict(int)
+            for tag in tags:
+                for other_id in self.tag_index[tag]:
+                    if other_id != question_id:
+                        common[other_id] += 1
+            ranked = sorted(common.items(), key=lambda item: (-item[1], item[0]))
+            self.neighbors[question_id] = [(count, other_id) for other_id, count in ranked]
+        return self
+
+    @classmethod
+    def from_files(cls, file_list):
+        """
+        从与process_file相同格式的JSON文件加载题库
+
+        Args:
+            file_list: JSON文件路径列表，问题id的生成规则与import_data一致
+        """
+        bank = cls()
+        for file_path in file_list:
+            file_name = Path(file_path).name.split('.')[0]
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for item in data:
+                bank.add_question(f"{file_name}_{item['id']}", item['question'], item.get('answer'), item.get('tags', []))
+        return bank.build()
+
+    @classmethod
+    def from_neo4j(cls, driver):
+        """从Neo4j一次性读出所有Question/Tag/Answer"""
+        query = """
+        MATCH (q:Question)
+        OPTIONAL MATCH (q)-[:HAS_TAG]->(t:Tag)
+        OPTIONAL MATCH (q)-[:HAS_ANSWER]->(a:Answer)
+        RETURN q.id as id, q.text as question, collect(DISTINCT t.name) as tags, head(collect(DISTINCT a.text)) as answer
+        """
+        bank = cls()
+        with driver.session() as session:
+            for record in session.run(query):
+                bank.add_question(record["id"], record["question"], record["answer"], record["tags"])
+        return bank.build()
+
+    def _to_question(self, question_id):
+        return {
+            "id": question_id,
+            "question": self.questions[question_id]
+        }
+
+    def get_question(self, tag, asked_questions=None):
+        """与graph.get_question语义相同：从带有该tag且未问过的问题中随机选一个"""
+        asked_questions = asked_questions or set()
+        candidates = self.tag_index.get(tag)
+        if not candidates:
+            return None
+
+        # 已问问题通常很少，先尝试几次直接随机抽取
+        for _ in range(4):
+            question_id = random.choice(candidates)
+            if question_id not in asked_questions:
+                return self._to_question(question_id)
+
+        candidates = [q for q in candidates if q not in asked_questions]
+        if not candidates:
+            return None
+        return self._to_question(random.choice(candidates))
+
+    def get_related_question(self, current_question_id, asked_questions=None, top_k=5):
+        """与graph.get_related_question语义相同：按共同标签数取top_k，再随机选一个"""
+        asked_questions = asked_questions or set()
+        ranked = self.neighbors.get(current_question_id)
+        if not ranked or top_k <= 0:
+            return None
+
+        top, boundary = [], []
+        for count, question_id in ranked:
+            if question_id in asked_questions:
+                continue
+            if len(top) < top_k:
+                top.append((count, question_id))
+            elif count == top[-1][0]:
+                boundary.append(question_id)
+            else:
+                break
+
+        if not top:
+            return None
+
+        # 与Cypher一样，排在第top_k位的并列问题随机取舍
+        if boundary:
+            last_count = top[-1][0]
+            fixed = [q for c, q in top if c != last_count]
+            tied = [q for c, q in top if c == last_count] + boundary
+            top = fixed + random.sample(tied, top_k - len(fixed))
+        else:
+            top = [q for c, q in top]
+
+        return self._to_question(random.choice(top))
+
+    def get_answer(self, question_id):
+        return self.answers.get(question_id)
@@ -0,0 +1,201 @@
+import random
+
+from src.graph import graph
+from src.graph.graph import get_driver, get_question, get_related_question, get_question_async, get_related_question_async
+
+PLAN_QUERY = """
+UNWIND range(0, size($tags) - 1) AS idx
+WITH idx, $tags[idx] AS tag
+MATCH (q:Question)-[:HAS_TAG]->(:Tag {name: tag})
+WHERE NOT q.id IN $asked_questions
+WITH idx, tag, q, rand() AS key
+ORDER BY key
+WITH idx, tag, collect({question: q, key: key})[..$seed_count] AS seeds
+UNWIND seeds AS sampled
+WITH idx, tag, sampled.question AS seed, sampled.key AS key
+OPTIONAL MATCH (seed)-[r:RELATED_TO]->(related:Question)
+WHERE NOT related.id IN $asked_questions
+WITH idx, tag, seed, key, related, r
+ORDER BY r.rank
+WITH idx, tag, seed, key, [x IN collect({id: related.id, question: related.text}) WHERE x.id IS NOT NULL][..$related_limit] AS related_list
+ORDER BY key
+RETURN idx, tag, collect({id: seed.id, question: seed.text, key: key, related: related_list}) AS seeds
+ORDER BY idx
+"""
+
+
+class QuestionPlan:
+    """
+    理论面试的整场出题计划。
+
+    计划在理论面试开始时一次性取回，按tag给出首个问题和后续相关问题，并保证全场不重复。
+    计划中某个问题不可用（已被问过或图谱中缺少相关问题表）时，退回到逐个查询。
+    """
+
+    def __init__(self, tags, follow_up_count=1, asked_questions=None, top_k=5):
+        self.tags = tags
+        self.follow_up_count = follow_up_count
+        self.top_k = top_k
+        self.asked_questions = set(asked_questions or ())
+        self.entries = {}
+
+    def build(self, seeds_by_tag):
+        """
+        从候选问题组装去重后的计划
+
+        Args:
+            seeds_by_tag: tag -> [{"id", "question", "key", "related": [{"id", "question"}]}]，
+                          key是抽样时的随机键，related列表已按相关度排好
+        """
+        # 按相关度排序related列表时打乱了候选的随机顺序，按抽样时的随机键重新排好
+        seeds_by_tag = {tag: sorted(seeds, key=lambda s: s["key"]) for tag, seeds in seeds_by_tag.items()}
+        related_by_id = {}
+        for seeds in seeds_by_tag.values():
+            for seed in seeds:
+                related_by_id[seed["id"]] = seed["related"]
+
+        planned = set(self.asked_questions)
+        for tag in self.tags:
+            if tag in self.entries:
+                continue
+            seed = next((s for s in seeds_by_tag.get(tag, []) if s["id"] not in planned), None)
+            if seed is None:
+                continue
+
+            questions = [{"id": seed["id"], "question": seed["question"]}]
+            planned.add(seed["id"])
+            current_id = seed["id"]
+            for _ in range(self.follow_up_count):
+                # 计划只取回了候选问题自己的相关问题表，后续问题留到提问时按当前问题逐个查询
+                related = related_by_id.get(current_id)
+                if related is None:
+                    break
+                candidates = [q for q in related if q["id"] not in planned][:self.top_k]
+                if not candidates:
+                    break
+                question = random.choice(candidates)
+                questions.append(question)
+                planned.add(question["id"])
+                current_id = question["id"]
+
+            self.entries[tag] = questions
+        return self
+
+    def mark_asked(self, question):
+        self.asked_questions.add(question["id"])
+        return question
+
+    def _planned_first(self, tag):
+        planned = self.entries.get(tag)
+        if planned and planned[0]["id"] not in self.asked_questions:
+            return self.mark_asked(planned[0])
+        return None
+
+    def _planned_related(self, tag, index):
+        planned = self.entries.get(tag, [])
+        if index + 1 < len(planned) and planned[index + 1]["id"] not in self.asked_questions:
+            return self.mark_asked(planned[index + 1])
+        return None
+
+    def _record_first(self, tag, question):
+        if question:
+            self.entries[tag] = [question]
+            self.mark_asked(question)
+        return question
+
+    def first_question(self, tag):
+        """取tag的首个问题，计划中没有可用问题时实时查询"""
+        question = self._planned_first(tag)
+        if question:
+            return question
+        return self._record_first(tag, get_question(tag, self.asked_questions))
+
+    async def first_question_async(self, tag):
+        """first_question的异步版本"""
+        question = self._planned_first(tag)
+        if question:
+            return question
+        return self._record_first(tag, await get_question_async(tag, self.asked_questions))
+
+    def related_question(self, tag, current_question, index):
+        """
+        取tag下第index个相关问题，计划中没有可用问题时实时查询
+
+        Args:
+            tag: 当前标签
+            current_question: 刚问过的问题
+            index: 第几个相关问题，从0开始
+        """
+        question = self._planned_related(tag, index)
+        if question:
+            return question
+
+        question = get_related_question(current_question["id"], self.asked_questions, top_k=self.top_k)
+        if question:
+            self.mark_asked(question)
+        return question
+
+    async def related_question_async(self, tag, current_question, index):
+        """related_question的异步版本"""
+        question = self._planned_related(tag, index)
+        if question:
+            return question
+
+        question = await get_related_question_async(current_question["id"], self.asked_questions, top_k=self.top_k)
+        if question:
+            self.mark_asked(question)
+        return question
+
+
+def get_question_plan(question_tags, follow_up_count=1, asked_questions=None, top_k=5):
+    """
+    理论面试开始时，一次查询取回整场面试的出题计划
+
+    Args:
+        question_tags: generate_question_tags生成的tag列表的列表
+        follow_up_count: 每个tag首个问题之后的相关问题数
+        asked_questions: 已问过的问题ID集合
+        top_k: 相关问题从最相关的top_k个中随机选择
+
+    Returns:
+        QuestionPlan: 出题计划，查询失败时为空计划，使用时逐个查询
+    """
+    tags = list(dict.fromkeys(tag for tag_list in question_tags for tag in tag_list))
+    plan = QuestionPlan(tags, follow_up_count, asked_questions, top_k)
+    if not tags:
+        return plan
+
+    # 内存题库本身就是微秒级查询，直接按顺序组装
+    if graph._question_bank is not None:
+        bank = graph._question_bank
+        for tag in tags:
+            question = bank.get_question(tag, plan.asked_questions)
+            if not question:
+                continue
+            questions = [plan.mark_asked(question)]
+            for _ in range(follow_up_count):
+                question = bank.get_related_question(question["id"], plan.asked_questions, top_k)
+                if not question:
+                    break
+                questions.append(plan.mark_asked(question))
+            plan.entries[tag] = questions
+        plan.asked_questions = set(asked_questions or ())
+        return plan
+
+    # 每个tag多取一些候选，保证tag之间题目重叠时仍能去重
+    seed_count = len(tags) * (follow_up_count + 1) + 1
+    related_limit = top_k + len(tags) * (follow_up_count + 1)
+    try:
+        with get_driver().session() as session:
+            result = session.run(PLAN_QUERY, {
+                "tags": tags,
+                "asked_questions": list(plan.asked_questions),
+                "seed_count": seed_count,
+                "related_limit": related_limit,
+            })
+            seeds_by_tag = {record["tag"]: record["seeds"] for record in result}
+    except Exception as e:
+        print(f"获取出题计划失败: {e}")
+        return plan
+
+    return plan.build(seeds_by_tag)
@@ -0,0 +1,96 @@
+import json
+
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+from src.llm import llm
+
+
+class CompatibleLLM(LLM):
+    """
+    通过OpenAI兼容接口调用通义模型的LangChain LLM。
+
+    同步调用复用llm.get_session()的keep-alive连接池，异步调用复用llm.get_async_client()，
+    并发数受llm.max_concurrency限制。llm.base_url指向fake_server时即为本地的假后端。
+    """
+
+    model_name: str = "qwen-turbo"
+    temperature: float = 0.3
+
+    @property
+    def _llm_type(self) -> str:
+        return "dashscope-compatible"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+    def _payload(self, prompt, stop, stream=False):
+        payload = llm.build_payload([{"role": "user", "content": prompt}], stream=stream)
+        payload["model"] = self.model_name
+        payload["temperature"] = self.temperature
+        if stop:
+            payload["stop"] = stop
+        return payload
+
+    @staticmethod
+    def _delta(line):
+        """解析一行SSE，返回增量文本，结束或无内容时返回None"""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content")
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        response = llm.get_session().post(
+            f"{llm.base_url}/chat/completions",
+            json=self._payload(prompt, stop),
+            timeout=(llm.connect_timeout, llm.read_timeout),
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        client = llm.get_async_client()
+        async with llm.get_async_semaphore():
+            response = await client.post(f"{llm.base_url}/chat/completions", json=self._payload(prompt, stop))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        with llm.get_session().post(
+            f"{llm.base_url}/chat/completions",
+            json=self._payload(prompt, stop, stream=True),
+            timeout=(llm.connect_timeout, llm.read_timeout),
+            stream=True,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                text = self._delta(line)
+                if text:
+                    chunk = GenerationChunk(text=text)
+                    if run_manager:
+                        run_manager.on_llm_new_token(text, chunk=chunk)
+                    yield chunk
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        client = llm.get_async_client()
+        async with llm.get_async_semaphore():
+            async with client.stream("POST", f"{llm.base_url}/chat/completions", json=self._payload(prompt, stop, stream=True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    text = self._delta(line)
+                    if text:
+                        chunk = GenerationChunk(text=text)
+                        if run_manager:
+                            await run_manager.on_llm_new_token(text, chunk=chunk)
+                        yield chunk
@@ -0,0 +1,112 @@
+import json
+import time
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeChatHandler(BaseHTTPRequestHandler):
+    """
+    最小的OpenAI兼容 /chat/completions 实现，用于离线测试。
+    默认回复最后一条用户消息的内容，可通过server.reply固定回复，server.delay模拟延迟。
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if not self.path.endswith('/chat/completions'):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        messages = payload.get('messages', [])
+        content = self.server.reply
+        if content is None:
+            content = messages[-1]['content'] if messages else ''
+
+        if self.server.delay:
+            time.sleep(self.server.delay)
+
+        if payload.get('stream'):
+            self._send_stream(payload, content)
+        else:
+            self._send_json(payload, content)
+
+    def _send_json(self, payload, content):
+        body = json.dumps({
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'model': payload.get('model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }]
+        }, ensure_ascii=False).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, payload, content):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write_chunk(data):
+            line = f'data: {data}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(line):X}\r\n'.encode('ascii') + line + b'\r\n')
+            self.wfile.flush()
+
+        for char in content:
+            write_chunk(json.dumps({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'model': payload.get('model'),
+                'choices': [{'index': 0, 'delta': {'content': char}, 'finish_reason': None}]
+            }, ensure_ascii=False))
+            if self.server.token_delay:
+                time.sleep(self.server.token_delay)
+        write_chunk('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_server(host='127.0.0.1', port=0, reply=None, delay=0, token_delay=0):
+    """
+    在后台线程启动假的LLM服务
+
+    Args:
+        port: 端口，0表示随机分配
+        reply: 固定回复内容，None时回显最后一条消息
+        delay: 每个请求返回前的延迟（秒）
+        token_delay: 流式输出时每个token之间的延迟（秒）
+
+    Returns:
+        (server, base_url): server.shutdown()停止服务，base_url可直接赋给llm.base_url
+    """
+    server = ThreadingHTTPServer((host, port), FakeChatHandler)
+    server.daemon_threads = True
+    server.reply = reply
+    server.delay = delay
+    server.token_delay = token_delay
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    return server, f'http://{host}:{server.server_address[1]}/v1'
+
+
+if __name__ == '__main__':
+    server, url = start_fake_server(port=9901)
+    print(f'假LLM服务已启动: {url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,10 +1,35 @@
-import os 
+import os
+import asyncio
+import threading
 import dashscope
 import requests
+import httpx
 import json
 
+from requests.adapters import HTTPAdapter
+
 from config.api_config import DASHSCOPE_API_KEY
-    
+from src.llm.scheduler import get_scheduler, estimate_request_tokens
+
+# OpenAI兼容接口地址，测试时可指向src/llm/fake_server.py启动的本地服务
+base_url = 'https://dashscope.aliyuncs.com/compatible-mode/v1'
+model_name = 'qwen-plus'
+
+# 连接池与超时配置（秒）
+connect_timeout = 5.0
+read_timeout = 60.0
+max_connections = 100
+max_keepalive_connections = 20
+# 同时在途的异步请求上限
+max_concurrency = 32
+# 需要安装h2才能开启HTTP/2
+http2 = False
+
+_session = None
+_session_lock = threading.Lock()
+_async_client = None
+_semaphore = None
+
 
 def build_request(system_prompt, content):
     messages = [
@@ -15,25 +40,85 @@ def build_request(system_prompt, content):
     return messages
 
 
-def get_llm_response(messages):
+def build_payload(messages, stream=False):
+    payload = {
+        'model': model_name,
+        'messages': messages,
+        # 仅当使用 Qwen3 系列模型且为非流式时需要显式关闭思考
+        'extra_body': {'enable_thinking': False}
+    }
+    if stream:
+        payload['stream'] = True
+    return payload
+
+
+def _headers():
+    return {
+        'Authorization': f'Bearer {DASHSCOPE_API_KEY}',
+        'Content-Type': 'application/json'
+    }
+
+
+def get_session():
+    """
+    获取进程内共享的requests会话，复用keep-alive连接
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=max_keepalive_connections, pool_maxsize=max_connections)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(_headers())
+                _session = session
+    return _session
+
+
+def get_async_client():
+    """
+    获取进程内共享的异步HTTP客户端，需要在事件循环中调用
+
+    客户端不绑定base_url，请求时按当前的base_url拼出完整地址，use_fake_backend之后切换到假后端
+    """
+    global _async_client, _semaphore
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            headers=_headers(),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections),
+            http2=http2,
+        )
+        _semaphore = asyncio.Semaphore(max_concurrency)
+    return _async_client
+
+
+def get_async_semaphore():
+    """
+    获取限制异步请求并发数的信号量，与共享的异步客户端一起创建
+    """
+    get_async_client()
+    return _semaphore
+
+
+async def close_async_client():
+    """
+    关闭共享的异步HTTP客户端，在进程退出时调用
+    """
+    global _async_client, _semaphore
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+        _semaphore = None
+
+
+def get_llm_response(messages, priority="interactive"):
     try:
-        url = 'https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions'
-
-        headers = {
-            'Authorization': f'Bearer {DASHSCOPE_API_KEY}',
-            'Content-Type': 'application/json'
-        }
-        
-        
-        payload = {
-            'model': 'qwen-plus',
-            'messages': messages,
-            # 仅当使用 Qwen3 系列模型且为非流式时需要显式关闭思考
-            'extra_body': {'enable_thinking': False}
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-        
+        get_scheduler().acquire(priority, model_name, estimate_request_tokens([m['content'] for m in messages]))
+        url = f'{base_url}/chat/completions'
+        response = get_session().post(url, json=build_payload(messages), timeout=(connect_timeout, read_timeout))
+
         if response.status_code == 200:
             result = response.json()
             # 兼容模式返回与 OpenAI 一致
@@ -45,4 +130,27 @@ def get_llm_response(messages):
 
     except Exception as e:
         print(f'API请求出错: {e}')
-        return None
\ No newline at end of file
+        return None
+
+
+async def get_llm_response_async(messages, priority="interactive"):
+    """
+    get_llm_response的异步版本，使用共享连接池，并发数受max_concurrency限制
+    """
+    try:
+        await get_scheduler().aacquire(priority, model_name, estimate_request_tokens([m['content'] for m in messages]))
+        client = get_async_client()
+        async with _semaphore:
+            response = await client.post(f'{base_url}/chat/completions', json=build_payload(messages))
+
+        if response.status_code == 200:
+            result = response.json()
+            return result['choices'][0]['message']['content']
+        else:
+            print(f'API请求失败，状态码: {response.status_code}')
+            print(response.text)
+            return None
+
+    except Exception as e:
+        print(f'API请求出错: {e}')
+        return None
@@ -0,0 +1,82 @@
+import threading
+
+from langchain_community.llms import Tongyi
+
+from config.api_config import DASHSCOPE_API_KEY
+from src.llm import llm
+from src.llm.compatible import CompatibleLLM
+
+# 模型客户端后端："tongyi" 使用DashScope SDK；"compatible" 走OpenAI兼容接口，复用src/llm/llm.py的连接池
+backend = "tongyi"
+# 启动时预先创建的 (model_name, temperature)
+preload_models = [
+    ("qwen-turbo", 0.3),
+    ("qwen-turbo", 0.5),
+    ("qwen-turbo", 0.8),
+    ("qwen-plus", 0.5),
+]
+
+_clients = {}
+_lock = threading.Lock()
+_factory = None
+
+
+def _default_factory(model_name, temperature):
+    if backend == "compatible":
+        return CompatibleLLM(model_name=model_name, temperature=temperature)
+    return Tongyi(api_key=DASHSCOPE_API_KEY, model_name=model_name, temperature=temperature)
+
+
+def get_llm(model_name="qwen-turbo", temperature=0.3):
+    """
+    获取进程内共享的模型客户端，同一 (model_name, temperature) 只创建一次
+
+    客户端本身不保存调用状态，可以在多个线程和协程中同时使用
+    """
+    key = (model_name, float(temperature))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = (_factory or _default_factory)(model_name, temperature)
+                _clients[key] = client
+    return client
+
+
+def set_llm_factory(factory=None):
+    """
+    替换创建客户端的方法并清空已创建的客户端，测试时可传入返回假模型的factory
+
+    Args:
+        factory: (model_name, temperature) -> LLM，None时恢复默认
+    """
+    global _factory
+    with _lock:
+        _factory = factory
+        _clients.clear()
+
+
+def use_fake_backend(reply=None, delay=0, token_delay=0):
+    """
+    启动本地的假LLM服务，之后get_llm返回的客户端都请求该服务，用于离线测试
+
+    Returns:
+        server: server.shutdown()停止服务
+    """
+    global backend
+    from src.llm.fake_server import start_fake_server
+
+    server, url = start_fake_server(reply=reply, delay=delay, token_delay=token_delay)
+    llm.base_url = url
+    backend = "compatible"
+    set_llm_factory(None)
+    return server
+
+
+def warm_up(models=None):
+    """预先创建常用的客户端，compatible后端同时建立共享的HTTP会话"""
+    for model_name, temperature in models or preload_models:
+        get_llm(model_name, temperature)
+    if backend == "compatible" and _factory is None:
+        llm.get_session()
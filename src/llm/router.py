@@ -0,0 +1,167 @@
+import time
+import threading
+
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from src.llm.registry import get_llm
+from src.llm.scheduler import admit, input_text
+from src.logger.logger import LoggerConfig, LogLevel
+
+# 模型档位，从快到慢
+TIERS = ["qwen-turbo", "qwen-plus", "qwen-max"]
+
+# 各调用点的路由策略：
+#   tier: 首选档位
+#   latency_budget: 首选档位最近调用的p95耗时（秒）超过该值时降到更快的档位
+#   large_prompt_tokens / large_tier: 估算的提示词token数超过阈值时改用的档位
+POLICIES = {
+    # 交互路径，候选人在等待，优先延迟
+    "classify": {"tier": "qwen-turbo", "latency_budget": 2.0},
+    "follow_up": {"tier": "qwen-turbo", "latency_budget": 3.0},
+    "interview": {"tier": "qwen-turbo", "latency_budget": 3.0},
+    "resume": {"tier": "qwen-turbo", "latency_budget": 20.0},
+    # 后台评分与报告，优先质量
+    "turn_score": {"tier": "qwen-turbo", "latency_budget": 8.0, "large_prompt_tokens": 2000, "large_tier": "qwen-plus"},
+    "report": {"tier": "qwen-plus", "latency_budget": 30.0, "large_prompt_tokens": 6000, "large_tier": "qwen-max"},
+}
+default_policy = {"tier": "qwen-turbo", "latency_budget": 5.0}
+
+# 每个 (调用点, 模型) 保留的耗时样本数，以及计算p95所需的最少样本数
+latency_window = 100
+min_samples = 20
+# 只参考最近这段时间（秒）的样本，降级后首选档位的旧样本过期，之后自动恢复首选档位
+latency_horizon = 300
+
+_latencies = {}
+_lock = threading.Lock()
+_logger = None
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        _logger = LoggerConfig(name="llm_router", base_dir="../../logs", log_level=LogLevel.DEBUG).get_logger()
+    return _logger
+
+
+def record_latency(call_site, model_name, seconds):
+    with _lock:
+        _latencies.setdefault((call_site, model_name), deque(maxlen=latency_window)).append((time.time(), seconds))
+
+
+def p95(call_site, model_name):
+    """该调用点上模型最近调用耗时的p95，样本不足时返回None"""
+    since = time.time() - latency_horizon
+    with _lock:
+        samples = sorted(seconds for at, seconds in _latencies.get((call_site, model_name), ()) if at >= since)
+    if len(samples) < min_samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def route(call_site, prompt="", tokens=None):
+    """
+    按调用点策略、估算的提示词token数和观测到的延迟选择模型
+
+    Args:
+        call_site: 调用点，对应POLICIES中的键
+        prompt: 提示词文本，用于本地估算token数
+        tokens: 已知的token数，传入时不再估算
+
+    Returns:
+        str: 模型名
+    """
+    from src.common.utils import estimate_tokens
+
+    policy = POLICIES.get(call_site, default_policy)
+    if tokens is None:
+        tokens = estimate_tokens(prompt)
+
+    model_name, reason = policy["tier"], "preferred"
+    if tokens > policy.get("large_prompt_tokens", float("inf")):
+        model_name, reason = policy["large_tier"], "large_prompt"
+
+    observed = p95(call_site, model_name)
+    index = TIERS.index(model_name)
+    while observed is not None and observed > policy["latency_budget"] and index > 0:
+        _get_logger().info(
+            f"router call_site={call_site} model={model_name} p95={observed:.2f}s "
+            f"超出预算{policy['latency_budget']}s，降级到{TIERS[index - 1]}"
+        )
+        index -= 1
+        model_name, reason = TIERS[index], "latency_fallback"
+        observed = p95(call_site, model_name)
+
+    _get_logger().debug(
+        f"router call_site={call_site} tokens={tokens} model={model_name} reason={reason} "
+        f"p95={'n/a' if observed is None else f'{observed:.2f}s'}"
+    )
+    return model_name
+
+
+def get_routed_llm(call_site, temperature, prompt="", tokens=None):
+    """
+    按路由结果获取共享的模型客户端，调用前经过准入调度，调用结束后记录耗时供后续路由参考
+
+    Returns:
+        (runnable, model_name)
+    """
+    model_name = route(call_site, prompt, tokens)
+
+    def on_end(run):
+        record_latency(call_site, model_name, (run.end_time - run.start_time).total_seconds())
+
+    return admit(get_llm(model_name, temperature).with_listeners(on_end=on_end), call_site, model_name), model_name
+
+
+class RoutedLLM(Runnable):
+    """
+    每次调用时按实际输入重新路由的模型，可以像模型一样接入调用链。
+
+    面试阶段的输入是系统提示词加上不断增长的对话历史，每轮按本轮输入估算token并参考最新的p95选择模型，
+    延迟超出预算时面试中途也能降级。model_name为最近一次调用选择的模型。
+    """
+
+    def __init__(self, call_site, temperature):
+        self.call_site = call_site
+        self.temperature = temperature
+        self.model_name = None
+
+    def _route(self, input):
+        model, self.model_name = get_routed_llm(self.call_site, self.temperature, prompt=input_text(input))
+        return model
+
+    @property
+    def InputType(self):
+        return get_llm(POLICIES.get(self.call_site, default_policy)["tier"], self.temperature).InputType
+
+    @property
+    def OutputType(self):
+        return get_llm(POLICIES.get(self.call_site, default_policy)["tier"], self.temperature).OutputType
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        return self._route(input).invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        return await self._route(input).ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator:
+        yield from self._route(input).stream(input, config, **kwargs)
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator:
+        async for chunk in self._route(input).astream(input, config, **kwargs):
+            yield chunk
+
+
+def latency_stats():
+    """各 (调用点, 模型) 的样本数与p95"""
+    with _lock:
+        keys = list(_latencies)
+    return [
+        {"call_site": call_site, "model": model_name,
+         "samples": len(_latencies[(call_site, model_name)]), "p95": p95(call_site, model_name)}
+        for call_site, model_name in keys
+    ]
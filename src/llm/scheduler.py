@@ -0,0 +1,283 @@
+import os
+import time
+import asyncio
+import threading
+
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# 优先级，数字越小越优先
+PRIORITIES = {"interactive": 0, "parsing": 1, "reports": 2}
+# 调用点所属的优先级，未列出的按interactive处理
+CALL_SITE_PRIORITY = {
+    "classify": "interactive",
+    "follow_up": "interactive",
+    "interview": "interactive",
+    "resume": "parsing",
+    "turn_score": "reports",
+    "report": "reports",
+}
+
+# 每个模型每分钟的请求数与token数限额（整个服务共用），未列出的模型使用default
+rate_limits = {
+    "default": {"rpm": 600, "tpm": 1_000_000},
+}
+# 共用上述限额的进程数。令牌桶只在进程内共享，多个uvicorn worker时每个进程按该值均分限额，
+# 默认读取uvicorn --workers使用的WEB_CONCURRENCY环境变量
+process_count = max(int(os.environ.get("WEB_CONCURRENCY", 1)), 1)
+# 各优先级放行时需要给更高优先级留出的桶容量比例，压力大时低优先级先让路
+reserve_ratio = {"interactive": 0.0, "parsing": 0.1, "reports": 0.3}
+# 估算token时为模型输出预留的数量
+completion_tokens = 256
+
+
+class TokenBucket:
+    """按每分钟限额匀速补充的令牌桶"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, reserve, now):
+        """取出amount后仍不低于reserve比例的容量所需等待的秒数"""
+        self._refill(now)
+        # 需要的量超过容量时等桶满即可放行
+        needed = min(min(amount, self.capacity) + self.capacity * reserve, self.capacity)
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    """排队中的一次申请，线程中用threading.Event唤醒，协程中用所在事件循环的asyncio.Event唤醒"""
+
+    def __init__(self, tokens, loop=None):
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.admitted = False
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+
+    def wake(self):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class AdmissionScheduler:
+    """
+    跨会话的LLM调用准入控制。
+
+    每个模型各有一个请求数桶和token数桶，每个 (模型, 优先级) 一个先进先出的等待队列。
+    申请先排到队尾，只有队首能放行；同一模型有更高优先级的申请在排队时，低优先级不会放行，
+    低优先级放行后还要给高优先级留出一定容量。放行由调度方扣减令牌后唤醒对应的等待方，
+    令牌不足时等待方按补充到所需令牌的时间定时唤醒，重新调度。
+    协程中使用aacquire，线程中（如报告队列）使用acquire，两者共享同一组令牌桶和队列。
+
+    令牌桶只在进程内共享，多进程部署时各进程的限额为rate_limits除以process_count。
+    """
+
+    def __init__(self, limits=None, processes=None):
+        self.limits = limits or rate_limits
+        self.processes = processes or process_count
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.queues = defaultdict(deque)
+        self.admitted = defaultdict(int)
+        self.wait_seconds = defaultdict(float)
+        self.max_wait_seconds = defaultdict(float)
+
+    def _buckets(self, key):
+        if key not in self.buckets:
+            limit = self.limits.get(key, self.limits["default"])
+            self.buckets[key] = (
+                TokenBucket(limit["rpm"] / self.processes),
+                TokenBucket(limit["tpm"] / self.processes),
+            )
+        return self.buckets[key]
+
+    def _dispatch(self, key):
+        """
+        按优先级从高到低依次放行各队列的队首，需持有self.lock
+
+        Returns:
+            队首仍需等待的秒数，没有排队的申请时返回None
+        """
+        requests, token_bucket = self._buckets(key)
+        for priority in sorted(PRIORITIES, key=PRIORITIES.get):
+            queue = self.queues.get((key, priority))
+            while queue:
+                waiter = queue[0]
+                now = time.monotonic()
+                reserve = reserve_ratio[priority]
+                wait = max(requests.wait_time(1, reserve, now), token_bucket.wait_time(waiter.tokens, reserve, now))
+                if wait > 0:
+                    # 更高优先级还在排队时，低优先级的队列都不放行
+                    return wait
+                queue.popleft()
+                requests.take(1)
+                token_bucket.take(waiter.tokens)
+                waiter.admitted = True
+                waited = now - waiter.started
+                self.admitted[priority] += 1
+                self.wait_seconds[priority] += waited
+                self.max_wait_seconds[priority] = max(self.max_wait_seconds[priority], waited)
+                waiter.wake()
+        return None
+
+    def _enqueue(self, priority, key, waiter):
+        with self.lock:
+            self.queues[(key, priority)].append(waiter)
+            return self._dispatch(key)
+
+    def _next(self, key, waiter):
+        """等待方醒来后重新调度，返回下一次等待的秒数，已放行时返回0"""
+        with self.lock:
+            if waiter.admitted:
+                return 0.0
+            return self._dispatch(key)
+
+    def _cancel(self, priority, key, waiter):
+        """等待被中断时移出队列，并让后面的申请继续调度"""
+        with self.lock:
+            if waiter.admitted:
+                return
+            self.queues[(key, priority)].remove(waiter)
+            self._dispatch(key)
+
+    def acquire(self, priority, key, tokens):
+        """在线程中等待放行"""
+        waiter = _Waiter(tokens)
+        wait = self._enqueue(priority, key, waiter)
+        try:
+            while not waiter.admitted:
+                waiter.event.wait(wait)
+                waiter.event.clear()
+                wait = self._next(key, waiter)
+        except BaseException:
+            self._cancel(priority, key, waiter)
+            raise
+
+    async def aacquire(self, priority, key, tokens):
+        """在协程中等待放行"""
+        waiter = _Waiter(tokens, asyncio.get_running_loop())
+        wait = self._enqueue(priority, key, waiter)
+        try:
+            while not waiter.admitted:
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+                wait = self._next(key, waiter)
+        except BaseException:
+            self._cancel(priority, key, waiter)
+            raise
+
+    def stats(self):
+        """各优先级的排队数、放行数与等待时间，以及各模型令牌桶的剩余量"""
+        with self.lock:
+            queue_depth = defaultdict(int)
+            for (key, priority), queue in self.queues.items():
+                queue_depth[priority] += len(queue)
+            return {
+                "processes": self.processes,
+                "queue_depth": {priority: queue_depth[priority] for priority in PRIORITIES},
+                "admitted": {priority: self.admitted[priority] for priority in PRIORITIES},
+                "avg_wait_ms": {
+                    priority: self.wait_seconds[priority] / self.admitted[priority] * 1000 if self.admitted[priority] else 0.0
+                    for priority in PRIORITIES
+                },
+                "max_wait_ms": {priority: self.max_wait_seconds[priority] * 1000 for priority in PRIORITIES},
+                "buckets": {
+                    key: {"requests": round(requests.level, 1), "tokens": round(token_bucket.level)}
+                    for key, (requests, token_bucket) in self.buckets.items()
+                },
+            }
+
+
+def input_text(input):
+    """把模型的输入（字符串、提示词值或消息列表）转成用于估算token的文本"""
+    if isinstance(input, str):
+        return input
+    if hasattr(input, "to_string"):
+        return input.to_string()
+    if isinstance(input, (list, tuple)):
+        return "\n".join(str(getattr(item, "content", item)) for item in input)
+    return str(input)
+
+
+def estimate_request_tokens(input):
+    """估算一次调用占用的token：提示词加上预留的输出"""
+    from src.common.utils import estimate_tokens
+
+    return estimate_tokens(input_text(input)) + completion_tokens
+
+
+class AdmittedRunnable(Runnable):
+    """
+    调用前先经过准入调度的模型包装，可以像模型一样接入调用链。
+
+    invoke/stream在线程中阻塞等待放行，ainvoke/astream在协程中等待放行。
+    """
+
+    def __init__(self, bound, key, priority):
+        self.bound = bound
+        self.key = key
+        self.priority = priority
+
+    @property
+    def InputType(self):
+        return self.bound.InputType
+
+    @property
+    def OutputType(self):
+        return self.bound.OutputType
+
+    def invoke(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        get_scheduler().acquire(self.priority, self.key, estimate_request_tokens(input))
+        return self.bound.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any):
+        await get_scheduler().aacquire(self.priority, self.key, estimate_request_tokens(input))
+        return await self.bound.ainvoke(input, config, **kwargs)
+
+    def stream(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator:
+        get_scheduler().acquire(self.priority, self.key, estimate_request_tokens(input))
+        yield from self.bound.stream(input, config, **kwargs)
+
+    async def astream(self, input, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator:
+        await get_scheduler().aacquire(self.priority, self.key, estimate_request_tokens(input))
+        async for chunk in self.bound.astream(input, config, **kwargs):
+            yield chunk
+
+
+def admit(runnable, call_site, key):
+    """按调用点的优先级给模型加上准入调度"""
+    return AdmittedRunnable(runnable, key, CALL_SITE_PRIORITY.get(call_site, "interactive"))
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """获取进程内共享的准入调度器"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AdmissionScheduler()
+    return _scheduler
@@ -3,25 +3,18 @@ import json
 import sys
 from typing import List, Tuple
 
-def get_project_score(session):
-    summary_list = []
-    summary_path = session["save_path"]["summary"]
-    for file in os.listdir(summary_path):
-        if file.startswith("project_"):
-            with open(os.path.join(summary_path, file), "r", encoding="utf-8") as f:
-                summary_list.append(json.load(f))
+from src.common.score_index import get_score_index
 
-    for summary in summary_list:
-        comment = summary["summary"]["overall_evaluation"]
-        score_list = summary["scores_by_turn"]
-        total_score = sum(score["score"] for score in score_list)
-        full_score = score_list[-1]["turn_id"] * 10
+def get_project_score(session):
+    # 项目报告生成时已写入得分索引，不再逐个读取summary目录下的文件
+    reports = get_score_index().session_reports(session["session_id"], kind="project")
 
-        print(f"\n项目名称：{file}")
-        print(f"项目得分：{total_score}")
-        print(f"项目满分：{full_score}")
-        print(f"项目评价：{comment}\n")
+    for report in reports:
+        print(f"\n项目名称：{report['report_id']}")
+        print(f"项目得分：{report['total']:g}")
+        print(f"项目满分：{report['full_score']:g}")
+        print(f"项目评价：{report['evaluation']}\n")
 
 
 def generate_final_report():
-    pass
\ No newline at end of file
+    pass
@@ -1,16 +1,28 @@
 import asyncio
 
+from src.common import session_store
+from src.common.session_store import get_store
+
 async def start_initial_interview(session):
     opening = f"你好，我是今天的面试官，请把你最新的简历发给我。"
-    print(f"\n面试官：{opening}")
+    session["channel"].say(opening)
+
+    # 简历可能由其他进程解析，通过会话存储等待通知，超时未上传则结束面试
+    store = get_store()
+    try:
+        await store.get_message(session["session_id"], "resume_uploaded", timeout=session_store.session_ttl)
+    except asyncio.TimeoutError:
+        session["channel"].say("长时间没有收到简历，本次面试先结束了。")
+        return
 
-    await session["resume_uploaded_event"].wait()
+    record = await store.aget(session["session_id"])
+    session["resume_path"] = record["resume_path"]
+    session["candidate_name"] = record["candidate_name"]
 
     opening = f"简历我已经收到了，我们正式就开始吧，你做个自我介绍吧。"
-    print(f"\n面试官：{opening}")
+    session["channel"].say(opening)
 
-    print("我：", end="")
-    user_input = input()
+    user_input = await session["channel"].receive()
 
 
 if __name__ == "__main__":
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import yaml
 import random
 import json
@@ -8,21 +9,32 @@ from langchain_core.messages import HumanMessage, SystemMessage, trim_messages
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableWithMessageHistory
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
+from langchain_core.exceptions import OutputParserException
 from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
 from langchain.memory import ConversationBufferMemory
-from langchain_community.llms import Tongyi
 
 from config.api_config import DASHSCOPE_API_KEY
 from src.common.utils import read_pdf, read_json, clean_str, update_test_status
 from src.common.history import LocalChatHistory
+from src.llm.router import get_routed_llm, route, RoutedLLM
+from src.common.chat_memory import BoundedHistoryStore
+from src.common.writer import get_writer
+from src.common.report_queue import get_report_queue
+from src.common.score_index import index_report
+from src.common.turn_scorer import TurnScorer, turn_pairs, fill_scores, format_scores
 
-store = {}
+# LRU淘汰的会话上下文，每个会话按token预算截取窗口
+store = BoundedHistoryStore()
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
+    return store.get(session_id)
 
-    return store[session_id]
+# 逐轮评分使用的评分标准
+SCORE_RUBRIC = """
+你是一名资深的互联网技术面试官，对项目面试中的一轮问答进行评分。
+根据回答的技术含金量、清晰度和逻辑性，给出0-10分的评分，并简要说明打分理由。
+0-3分为表现差，4-7分为表现一般，8-10分为表现优秀。注意，除非回答真的很差或很优秀，否则不要轻易给差或者优秀档次的分数。
+"""
 
 def choose_project(experience: List[Dict]) -> Dict:
     """随机挑一个项目"""
@@ -31,10 +43,11 @@ def choose_project(experience: List[Dict]) -> Dict:
 
     return project_name, project
 
-def start_project_interview(session):
+async def start_project_interview(session):
     session_id = session["session_id"]
     resume_json_path = session["resume_path"]
     resume = read_json(resume_json_path)
+    channel = session["channel"]
 
     projects = resume["项目经历"]
     
@@ -42,7 +55,7 @@ def start_project_interview(session):
     project_name = clean_str(project_name)
 
     history_path = os.path.join(session["save_path"]["dialog"], f"{project_name}.json")
-    chat_history = LocalChatHistory(session_id, history_path)
+    chat_history = LocalChatHistory(session_id, history_path, journal=True)
 
     # with open("./data/prompt/project_pompt.yaml", "r", encoding="utf-8") as f:
     #     system_prompt_dict = yaml.safe_load(f)
@@ -64,8 +77,9 @@ def start_project_interview(session):
         MessagesPlaceholder(variable_name="messages")
     ])
     
-    model_name, temperature = "qwen-turbo", 0.8
-    model = Tongyi(api_key=DASHSCOPE_API_KEY, model_name=model_name, temperature=temperature)
+    temperature = 0.8
+    # 每轮按系统提示词加对话历史重新路由，对话变长或延迟超出预算时中途切换模型
+    model = RoutedLLM("interview", temperature)
 
     chain = prompt_template | model
 
@@ -77,33 +91,38 @@ def start_project_interview(session):
         "details": project
     }
     chat_history.history["config"] = {
-        "model_name": model_name,
+        "model_name": route("interview", system_prompt),
+        "routing": "per_turn",
         "temperature": temperature,
     }
     chat_history.history["type"] = session["current_state"]
     chat_history._save_history()
 
     opening = f"我看到你做了一个{project_name}的项目是吗，你来介绍一下吧"
-    print(f"\n面试官：{opening}")
+    channel.say(opening)
     chat_history.add_turn(opening, "开场对话，这轮对话不记入得分")
 
+    # 候选人的回答对应上一个问题，每轮记录后立即在后台评分，与下一个问题并行
+    scorer = TurnScorer(SCORE_RUBRIC)
+    last_question = opening
+
     for i in range(10):
-        print("我：", end="")
-        user_input = input()
+        user_input = await channel.receive()
 
         if user_input == "结束" or user_input.lower() == "quit":
             break
             
         try:
-            response = with_message_history.invoke(
+            # 边生成边推送，完整内容生成结束后再写入对话记录
+            ai_response = await channel.astream(with_message_history.astream(
                 {"messages": [HumanMessage(content=user_input)]},
                 config=config
-            )
-            ai_response = str(response)
-            print(f"\n面试官：{ai_response}")
+            ))
             
             # 记录对话到本地存储
-            chat_history.add_turn(ai_response, user_input)
+            turn = chat_history.add_turn(ai_response, user_input)
+            scorer.submit(turn["turn_id"], last_question, user_input)
+            last_question = ai_response
             
         except Exception as e:
             print(f"Error: {e}")
@@ -112,53 +131,56 @@ def start_project_interview(session):
     project["topic"]["已考核"] = True
     update_test_status(resume_json_path, "项目经历", project_name)
     history_path = chat_history.end_session()
+    store.evict(session_id)
+    scores_by_turn = await scorer.results()
     
-    generate_project_report(session, history_path)
+    # 项目面试报告交给后台队列生成，多个项目的报告并行
+    get_report_queue().submit(session_id, f"project_{project_name}", generate_project_report, session, history_path, scores_by_turn)
+
 
+def generate_project_report(session, file_path: str, scores_by_turn: list = None) -> dict:
+    """
+    生成项目面试报告
 
-def generate_project_report(session, file_path: str) -> dict:
-    if not os.path.exists(file_path):
+    逐轮评分已在面试过程中完成，这里只补评缺失的轮次，再用一次调用生成面试总结
+    """
+    chat_history = get_writer().read_json(file_path)
+    if chat_history is None:
         print(f"错误：文件不存在 {file_path}")
         return {}
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        chat_history = json.load(f)
-
-    # 1. 提取所需数据
+    # 1. 提取所需数据，补齐在线评分失败的轮次
     project_name = chat_history["topic"]["name"]
     project_details = chat_history["topic"]["details"]
     conversations = chat_history["conversations"]
+    scores_by_turn = fill_scores(SCORE_RUBRIC, turn_pairs(conversations, answer_follows=True), scores_by_turn)
 
-    # 2. 定义提示词模板（与之前相同）
+    # 2. 定义提示词模板
     system_prompt_str = """
     你是一名资深的互联网技术面试官，擅长对候选人的技术能力和项目经验进行深度评估。
 
-    你的任务是基于我提供的面试对话记录，完成以下两项工作：
-    1.  生成面试总结：从回答逻辑、技术深度、问题解决能力、沟通表达和项目掌握度等多个维度，对候选人进行全面评估，形成一份结构化的面试总结报告。
-    2.  逐轮对话打分：对面试中的每一轮对话（一问一答），根据其技术含金量、回答的清晰度和逻辑性，给出1-10分的评分，并简要说明打分理由。
-    3.  0-3分为表现差，4-7分为表现一般，8-10分为表现优秀。注意，除非回答真的很差或很优秀，否则不要轻易给差或者优秀档次的分数。
+    你的任务是基于我提供的逐轮评分和打分理由，从回答逻辑、技术深度、问题解决能力、沟通表达和项目掌握度等多个维度，
+    对候选人进行全面评估，形成一份结构化的面试总结报告。
 
-    请注意：你的语气应专业、客观，评估应完全基于对话内容，避免主观臆断。
+    请注意：你的语气应专业、客观，评估应完全基于评分和打分理由，避免主观臆断。
     """
 
     user_prompt_str = """
-    以下是本次面试的详细信息和对话记录：
+    以下是本次面试的详细信息和逐轮评分：
 
     ---
     **面试信息**
-    **候选人姓名**：{candidate_name}
     **面试项目**：{project_name}
     **项目描述**：
     {project_details}
 
     ---
-    **对话记录**
-    {conversations_text}
+    **逐轮评分**
+    {scores_text}
 
     ---
     请严格按照以下JSON格式输出结果，不要包含任何额外文字或解释：
     {{
-    "summary": {{
         "overall_evaluation": "对候选人的总体评估。",
         "strengths": [
         "优势点1",
@@ -169,56 +191,45 @@ def generate_project_report(session, file_path: str) -> dict:
         "可提升点2"
         ],
         "final_recommendation": "（如：推荐/继续观察/不推荐，并说明理由）"
-    }},
-    "scores_by_turn": [
-        {{
-        "turn_id": 1,
-        "score": 8,
-        "reason": "简要说明打分理由。"
-        }},
-        {{
-        "turn_id": 2,
-        "score": 9,
-        "reason": "简要说明打分理由。"
-        }}
-    ]
     }}
     """
     # 3. 准备调用链和LLM
-    llm = Tongyi(api_key=DASHSCOPE_API_KEY, model_name="qwen-turbo", temperature=0.5) 
+    inputs = {
+        "project_name": project_name,
+        "project_details": json.dumps(project_details, ensure_ascii=False, indent=4),
+        "scores_text": format_scores(scores_by_turn),
+    }
+    llm, _ = get_routed_llm("report", 0.5, prompt=system_prompt_str + user_prompt_str.format(**inputs))
     prompt = ChatPromptTemplate.from_messages([
-        SystemMessage(content=system_prompt_str),
-        HumanMessage(content=user_prompt_str)
+        ("system", system_prompt_str),
+        ("human", user_prompt_str)
     ])
-    
-    # 格式化对话记录
-    conversations_text = ""
-    for conv in conversations:
-        conversations_text += f"第 {conv['turn_id']} 轮\n"
-        conversations_text += f"面试官：{conv['agent']}\n"
-        conversations_text += f"候选人：{conv['user']}\n\n"
         
     chain = prompt | llm | JsonOutputParser()
 
     # 4. 调用LLM并返回结果
     try:
-        response = chain.invoke({
-            "project_name": project_name,
-            "project_details": json.dumps(project_details, ensure_ascii=False, indent=4),
-            "conversations_text": conversations_text,
-        })
+        response = {
+            "summary": chain.invoke(inputs),
+            "scores_by_turn": scores_by_turn,
+        }
 
         output_dir = session["save_path"]["summary"]
         
         base_filename = f"project_{project_name}.json"
         output_path = os.path.join(output_dir, base_filename)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(response, f, ensure_ascii=False, indent=4)
+        get_writer().write_json(output_path, response, indent=4)
+        positions = read_json(session["resume_path"]).get("技术总结", {}).get("岗位", [])
+        index_report(session, f"project_{project_name}", response, tags=positions)
         
         print(f"{project_name}面试报告已保存到：{output_path}")
 
         return response
+
+    except OutputParserException:
+        # 交给报告队列重试
+        raise
         
     except Exception as e:
         print(f"调用LLM或保存文件时发生错误: {e}")
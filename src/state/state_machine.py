@@ -5,12 +5,16 @@ from src.state.initial import start_initial_interview
 from src.state.theory import start_theory_interview
 from src.state.project import start_project_interview
 from src.state.final import get_project_score
+from src.common.writer import get_writer
+from src.common.session_store import get_store
+from src.common.report_queue import get_report_queue
 
 def get_current_state(session):
     return session["current_state"]
 
-def set_state(session, state):
+async def set_state(session, state):
     session["current_state"] = state
+    await get_store().aupdate(session["session_id"], current_state=state)
 
 def can_proceed(session):
     if get_current_state(session) == "initial":
@@ -31,29 +35,33 @@ def can_proceed(session):
 
 async def start_machine(session):
     print(f"会话 {session['session_id']}\n 状态机启动。\n")
-    set_state(session, "initial")
+    await set_state(session, "initial")
     print(f"状态转移至initial")
 
     # 调用异步版本的初始面试函数
     await start_initial_interview(session)
 
+    # 状态转移前等待上一阶段的文件全部落盘
+    await get_writer().aflush()
     if can_proceed(session):
-        set_state(session, "theory")
+        await set_state(session, "theory")
         print(f"状态转移至theory")
-        start_theory_interview(session)
+        await start_theory_interview(session)
     
     # if can_proceed(session):
-    #     set_state(session, "project")
+    #     await set_state(session, "project")
     #     print(f"状态转移至project")
-    #     start_project_interview(session)
+    #     await start_project_interview(session)
         
 
     # if can_proceed(session):
-    #     set_state(session, "final")
+    #     await set_state(session, "final")
     #     print(f"状态转移至final")
+    #     await get_report_queue().wait(session["session_id"])
     #     get_project_score(session)
     
-    set_state(session, "end")
+    await get_writer().aflush()
+    await set_state(session, "end")
     print(f"状态转移至end")
     
     # 面试结束后的清理工作
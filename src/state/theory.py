@@ -1,4 +1,5 @@
 import os
+import asyncio
 import yaml
 import random
 import json
@@ -10,32 +11,46 @@ from langchain_core.messages import HumanMessage, SystemMessage, trim_messages
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables import RunnableWithMessageHistory
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
+from langchain_core.exceptions import OutputParserException
 from langchain_core.chat_history import BaseChatMessageHistory, InMemoryChatMessageHistory
 from langchain.memory import ConversationBufferMemory
-from langchain_community.llms import Tongyi
 
 from config.api_config import DASHSCOPE_API_KEY, NEO4J_PASSWORD
-from src.common.utils import read_pdf, read_json, clean_str, update_test_status, side_llm_request, generate_question_tags
+from src.common.utils import read_pdf, read_json, clean_str, update_test_status, aside_llm_request, astream_side_llm_request, generate_question_tags
 from src.common.history import LocalChatHistory
-from src.graph.graph import get_question, get_related_question
+from src.llm.router import get_routed_llm, route, RoutedLLM
+from src.common.chat_memory import BoundedHistoryStore
+from src.common.writer import get_writer
+from src.common.report_queue import get_report_queue
+from src.common.score_index import index_report
+from src.common.language_detect import detect_language, detect_cpp_refinement, record_detection, fast_path_confidence
+from src.common.turn_scorer import TurnScorer, turn_pairs, fill_scores, format_scores
+from src.graph.plan import get_question_plan
 from src.common.history import LocalChatHistory
 
-store = {}
+# LRU淘汰的会话上下文，每个会话按token预算截取窗口
+store = BoundedHistoryStore()
 
 def get_session_history(session_id: str) -> BaseChatMessageHistory:
-    if session_id not in store:
-        store[session_id] = InMemoryChatMessageHistory()
+    return store.get(session_id)
 
-    return store[session_id]
+# 逐轮评分使用的评分标准
+SCORE_RUBRIC = """
+你是一名专业的评估官，对一轮问答进行客观公正的评分。
+主要根据回答的正确性、完整性和清晰度进行0-10分评分，并简要说明打分理由。
+评分标准：0-4分为回答错误、不知道、模糊，5-7分为回答基本正确但不完整，8-10分为回答准确且完整。
+给分可以严格一点。
+"""
 
 
-def start_theory_interview(session):
+async def start_theory_interview(session):
     """
     开始理论面试流程
     """
     session_id = session["session_id"]
     resume_json_path = session["resume_path"]
     resume = read_json(resume_json_path)
+    channel = session["channel"]
     
     # 获取简历中的技术栈分析
     coding_language = resume["技术总结"]["语言"]
@@ -43,35 +58,39 @@ def start_theory_interview(session):
     
     # 询问候选人熟悉的语言
     opening = "你熟悉哪个开发语言？"
-    print(f"\n面试官：{opening}")
+    channel.say(opening)
 
-    print("我：", end="")
-    user_input = input()
+    user_input = await channel.receive()
 
-    # 解析用户输入的语言
-    side_prompt = "解析输入，确定并返回用户表明的熟悉的编程语言的名字，全部小写，如: python。如果是语言是c++，并且有提到版本，请返回c++的版本，例如：c++11，否则返回c++"
-    side_result = side_llm_request(side_prompt, user_input)
+    # 解析用户输入的语言，常见说法本地识别，置信度低时才调用LLM
+    side_result, confidence = detect_language(user_input, resume=coding_language)
+    record_detection(confidence >= fast_path_confidence)
+    if confidence < fast_path_confidence:
+        side_prompt = "解析输入，确定并返回用户表明的熟悉的编程语言的名字，全部小写，如: python。如果是语言是c++，并且有提到版本，请返回c++的版本，例如：c++11，否则返回c++"
+        side_result = await aside_llm_request(side_prompt, user_input, use_cache=True)
     
     if side_result.lower() == "c++":
         opening = "有了解c++的一些新特性吗？"
-        print(f"\n面试官：{opening}")
+        channel.say(opening)
 
-        print("我：", end="")
-        user_refine_input = input()
+        user_refine_input = await channel.receive()
 
-        side_prompt = "解析输入，确定并返回用户表明的熟悉的c++的版本，全字母小写，例如：c++11，如果不能确定则返回c++"
-        side_result = side_llm_request(side_prompt, user_input + " " + user_refine_input)
+        side_result, confidence = detect_cpp_refinement(user_refine_input)
+        record_detection(confidence >= fast_path_confidence)
+        if confidence < fast_path_confidence:
+            side_prompt = "解析输入，确定并返回用户表明的熟悉的c++的版本，全字母小写，例如：c++11，如果不能确定则返回c++"
+            side_result = await aside_llm_request(side_prompt, user_input + " " + user_refine_input, use_cache=True)
     
     coding_language = side_result.lower()
 
     opening = f"好，那先来看看你对这个语言的掌握程度。"
-    print(f"\n面试官：{opening}")
+    channel.say(opening)
 
     question_tags = generate_question_tags(coding_language, potential_position)
     
     # 初始化对话历史
     history_path = os.path.join(session["save_path"]["dialog"], f"theory.json")
-    chat_history = LocalChatHistory(session_id, history_path)
+    chat_history = LocalChatHistory(session_id, history_path, journal=True)
     
     # 设置系统提示词 - 明确LLM的角色
     system_prompt = f"""
@@ -88,8 +107,9 @@ def start_theory_interview(session):
         MessagesPlaceholder(variable_name="messages")
     ])
     
-    model_name, temperature = "qwen-turbo", 0.8
-    model = Tongyi(api_key=DASHSCOPE_API_KEY, model_name=model_name, temperature=temperature)
+    temperature = 0.8
+    # 每轮按系统提示词加对话历史重新路由，对话变长或延迟超出预算时中途切换模型
+    model = RoutedLLM("interview", temperature)
     chain = prompt_template | model
     with_message_history = RunnableWithMessageHistory(chain, get_session_history)
     
@@ -99,13 +119,19 @@ def start_theory_interview(session):
         "potential_position": potential_position,
     }
     chat_history.history["config"] = {
-        "model_name": model_name,
+        "model_name": route("interview", system_prompt),
+        "routing": "per_turn",
         "temperature": temperature,
     }
     chat_history.history["type"] = session["current_state"]
     chat_history._save_history()
+
+    # 每轮问答记录后立即在后台评分，与下一个问题并行
+    scorer = TurnScorer(SCORE_RUBRIC)
     
-    asked_questions = set()
+    # 理论面试开始时一次取回整场的出题计划，候选人提前结束时剩余部分直接丢弃
+    follow_up_count = randint(1, 1)
+    plan = await asyncio.to_thread(get_question_plan, question_tags, follow_up_count, top_k=5)
     should_exit = False  # 添加全局退出标志
 
     # 遍历question_tags中的每个tag_list
@@ -119,23 +145,22 @@ def start_theory_interview(session):
                 break
                 
             # 1. 从图谱获取第一个问题
-            current_question = get_question(tag, asked_questions)
+            current_question = await plan.first_question_async(tag)
             if not current_question:
                 print(f"\n没有找到标签'{tag}'的问题，跳过")
                 continue
                 
-            asked_questions.add(current_question["id"])
-            print(f"\n面试官：{current_question['question']}")
+            channel.say(current_question['question'])
 
-            print("我：", end="")
-            user_input = input()
+            user_input = await channel.receive()
 
             if user_input == "结束" or user_input.lower() == "quit":
                 should_exit = True
                 break
 
             # 记录图谱问题和用户回答
-            chat_history.add_turn(current_question["question"], user_input)
+            turn = chat_history.add_turn(current_question["question"], user_input)
+            scorer.submit(turn["turn_id"], current_question["question"], user_input)
 
             # LLM追问一次 - 使用side_llm_request方法
             try:
@@ -154,45 +179,43 @@ def start_theory_interview(session):
                 
                 # 将面试官问题和候选人回答作为user_input传给side_llm_request
                 combined_input = f"面试官问题：{current_question['question']}\n候选人回答：{user_input}\n\n请生成一个追问问题："
-                follow_up_question = side_llm_request(context_prompt, combined_input)
-                print(f"\n面试官：{follow_up_question}")
+                follow_up_question = await channel.astream(astream_side_llm_request(context_prompt, combined_input))
 
-                print("我：", end="")
-                user_input = input()
+                user_input = await channel.receive()
                 
                 if user_input == "结束" or user_input.lower() == "quit":
                     should_exit = True
                     break
 
                 # 记录LLM追问和用户回答
-                chat_history.add_turn(follow_up_question, user_input)
+                turn = chat_history.add_turn(follow_up_question, user_input)
+                scorer.submit(turn["turn_id"], follow_up_question, user_input)
                 
             except Exception as e:
                 print(f"LLM追问出错: {e}")
             
-            for i in range(randint(1, 1)):
+            for i in range(follow_up_count):
                 if should_exit:
                     break
                     
                 # 获取与当前问题相关的下一个问题
-                next_question = get_related_question(current_question["id"], asked_questions, top_k=5)
+                next_question = await plan.related_question_async(tag, current_question, i)
                 if not next_question:
                     print(f"\n没有找到与'{current_question['question'][:20]}...'相关的问题，结束该tag的提问")
                     break
                     
                 current_question = next_question  # 更新当前问题
-                asked_questions.add(next_question["id"])
-                print(f"\n面试官：{next_question['question']}")
+                channel.say(next_question['question'])
 
-                print("我：", end="")
-                user_input = input()
+                user_input = await channel.receive()
 
                 if user_input == "结束" or user_input.lower() == "quit":
                     should_exit = True
                     break
                 
                 # 记录相关问题和用户回答
-                chat_history.add_turn(next_question["question"], user_input)
+                turn = chat_history.add_turn(next_question["question"], user_input)
+                scorer.submit(turn["turn_id"], next_question["question"], user_input)
 
                 # LLM追问
                 try:
@@ -206,18 +229,17 @@ def start_theory_interview(session):
                     
                     # 将面试官问题和候选人回答作为user_input传给side_llm_request
                     combined_input = f"面试官问题：{next_question['question']}\n候选人回答：{user_input}\n\n请生成一个追问问题："
-                    follow_up_question = side_llm_request(context_prompt, combined_input)
-                    print(f"\n面试官：{follow_up_question}")
+                    follow_up_question = await channel.astream(astream_side_llm_request(context_prompt, combined_input))
 
-                    print("我：", end="")
-                    user_input = input()
+                    user_input = await channel.receive()
                     
                     if user_input == "结束" or user_input.lower() == "quit":
                         should_exit = True
                         break
 
                     # 记录LLM追问和用户回答
-                    chat_history.add_turn(follow_up_question, user_input)
+                    turn = chat_history.add_turn(follow_up_question, user_input)
+                    scorer.submit(turn["turn_id"], follow_up_question, user_input)
                     
                 except Exception as e:
                     print(f"LLM追问出错: {e}")
@@ -227,47 +249,49 @@ def start_theory_interview(session):
     
     # 结束会话
     history_path = chat_history.end_session()
+    store.evict(session_id)
+    scores_by_turn = await scorer.results()
     
-    # 生成理论面试报告
-    generate_theory_report(session, history_path)
+    # 理论面试报告交给后台队列生成，不阻塞后续流程
+    get_report_queue().submit(session_id, "theory", generate_theory_report, session, history_path, scores_by_turn)
 
 
-def generate_theory_report(session, file_path: str) -> dict:
+def generate_theory_report(session, file_path: str, scores_by_turn: list = None) -> dict:
     """
     生成理论面试报告
+
+    逐轮评分已在面试过程中完成，这里只补评缺失的轮次，再用一次调用生成总体评估
     """
-    if not os.path.exists(file_path):
+    chat_history = get_writer().read_json(file_path)
+    if chat_history is None:
         print(f"错误：文件不存在 {file_path}")
         return {}
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        chat_history = json.load(f)
-
-    # 1. 提取所需数据
+    # 1. 提取所需数据，补齐在线评分失败的轮次
     test_field = [chat_history["topic"]["coding_language"]]
     test_field.extend(chat_history["topic"]["potential_position"])
     conversations = chat_history["conversations"]
+    scores_by_turn = fill_scores(SCORE_RUBRIC, turn_pairs(conversations), scores_by_turn)
 
     # 2. 定义提示词模板
     system_prompt_str = """
     你是一名专业的评估官，擅长对问答进行客观公正的评估。
 
-    你的任务是基于问答对话记录，完成以下两项工作：
-    1. 生成总体评估：从问题理解能力、回答准确性、回答完整性和表达清晰度等维度，对问答进行全面评估。
-    2. 逐轮对话打分：对每一轮问答，主要根据回答的正确性、完整性和清晰度进行1-10分评分，并简要说明打分理由。
-    3. 评分标准：0-4分为回答错误、不知道、模糊，5-7分为回答基本正确但不完整，8-10分为回答准确且完整。
+    你的任务是基于逐轮问答的评分和打分理由，从问题理解能力、回答准确性、回答完整性和表达清晰度等维度，
+    对问答进行全面评估，形成总体评估。
 
-    请注意：你的评估应基于对话内容的客观分析，主要关注回答的正确性和完整性，给分可以严格一点。
+    请注意：你的评估应基于评分和打分理由的客观分析，主要关注回答的正确性和完整性。
     """
 
     user_prompt_str = """
-    以下是问答对话记录：
+    以下是考察范围：{test_field}
+
+    以下是逐轮问答的评分：
 
-    {conversations_text}
+    {scores_text}
 
     请严格按照以下JSON格式输出结果，不要包含任何额外文字或解释：
     {{
-    "summary": {{
         "overall_evaluation": "对问答的总体评估，主要关注回答的正确性和完整性。",
         "strengths": [
         "优势点1",
@@ -278,34 +302,16 @@ def generate_theory_report(session, file_path: str) -> dict:
         "可提升点2"
         ],
         "final_recommendation": "（如：表现优秀/表现良好/需要改进，并说明理由）"
-    }},
-    "scores_by_turn": [
-        {{
-        "turn_id": 1,
-        "score": 8,
-        "reason": "简要说明打分理由，主要基于回答的正确性。"
-        }},
-        {{
-        "turn_id": 2,
-        "score": 9,
-        "reason": "简要说明打分理由，主要基于回答的正确性。"
-        }}
-    ]
     }}
     """
     
     # 3. 准备调用链和LLM
-    llm = Tongyi(api_key=DASHSCOPE_API_KEY, model_name="qwen-turbo", temperature=0.5) 
-    
-    # 格式化对话记录
-    conversations_text = ""
-    for conv in conversations:
-        conversations_text += f"第 {conv['turn_id']} 轮\n"
-        conversations_text += f"问题：{conv['user']}\n"
-        conversations_text += f"回答：{conv['agent']}\n\n"
-    
     # 直接构造完整的用户提示词
-    formatted_user_prompt = user_prompt_str.format(conversations_text=conversations_text)
+    formatted_user_prompt = user_prompt_str.format(
+        test_field="、".join(test_field),
+        scores_text=format_scores(scores_by_turn),
+    )
+    llm, _ = get_routed_llm("report", 0.5, prompt=system_prompt_str + formatted_user_prompt)
     
     prompt = ChatPromptTemplate.from_messages([
         SystemMessage(content=system_prompt_str),
@@ -316,20 +322,27 @@ def generate_theory_report(session, file_path: str) -> dict:
 
     # 4. 调用LLM并返回结果
     try:
-        response = chain.invoke({})
+        response = {
+            "summary": chain.invoke({}),
+            "scores_by_turn": scores_by_turn,
+        }
 
         output_dir = session["save_path"]["summary"]
         
         base_filename = f"theory.json"
         output_path = os.path.join(output_dir, base_filename)
         
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(response, f, ensure_ascii=False, indent=4)
+        get_writer().write_json(output_path, response, indent=4)
+        index_report(session, "theory", response, tags=test_field)
         
         print(f"问答评估报告已保存到：{output_path}")
 
         return response
+
+    except OutputParserException:
+        # 交给报告队列重试
+        raise
         
     except Exception as e:
         print(f"调用LLM或保存文件时发生错误: {e}")
-        return {}
\ No newline at end of file
+        return {}